@@ -0,0 +1,238 @@
+"""Benchmark datacommon.google_app against a local fake Sheets API
+
+Usage:
+
+    python -m benchmarks.bench_google_app --rows 5000 --cols 10 --latency 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from datacommon.google_app import QuotaScheduler, RequestMetrics, Sheet, ValuesCache
+
+from .fake_sheets import FakeSheetsServer, write_credentials
+
+__all__ = [
+    'SCENARIOS',
+    'run_scenario',
+    'main',
+]
+
+SPREADSHEET_ID = 'benchmark'
+SHEET_NAME = 'data'
+
+def make_rows(rows: int, cols: int, seed: int=0) -> list:
+    return [
+        ['r{}c{}'.format(i + seed, j) if j % 2 else (i + seed) * cols + j for j in range(cols)]
+        for i in range(rows)
+    ]
+
+def _full_range(options) -> str:
+    return Sheet.format_range(SHEET_NAME, 'A1:{}{}'.format(Sheet.column_letter(options.cols), options.rows))
+
+def bench_metadata(sheet, options):
+    for _ in range(options.repeat):
+        sheet.get_sheet_properties(SHEET_NAME)
+    return options.repeat
+
+def bench_single_reads(sheet, options):
+    for i in range(options.repeat):
+        row = i % options.rows + 1
+        sheet.get_values_by_range(Sheet.format_range(SHEET_NAME, 'A{0}:{1}{0}'.format(row, Sheet.column_letter(options.cols))))
+    return options.repeat
+
+def bench_batch_read(sheet, options):
+    sheet.get_values_by_range(_full_range(options))
+    return 1
+
+def bench_windowed_read(sheet, options):
+    for _ in sheet.iter_rows(SHEET_NAME):
+        pass
+    return 1
+
+def bench_grid_stream(sheet, options):
+    for _ in sheet.iter_grid_data(ranges=[_full_range(options)]):
+        pass
+    return 1
+
+def bench_cached_reads(sheet, options):
+    for _ in range(options.repeat):
+        sheet.get_values_by_range(_full_range(options))
+    return options.repeat
+
+def bench_large_write(sheet, options):
+    sheet.update_values_by_range(Sheet.format_range(SHEET_NAME, 'A1'), make_rows(options.rows, options.cols, seed=1))
+    return 1
+
+def bench_appends(sheet, options):
+    chunk = max(1, options.rows // options.repeat)
+    for i in range(options.repeat):
+        sheet.append_values(Sheet.format_range(SHEET_NAME, 'A1'), make_rows(chunk, options.cols, seed=options.rows + i * chunk))
+    return options.repeat
+
+def bench_sync(sheet, options):
+    rows = make_rows(options.rows, options.cols)
+    for i in range(0, len(rows), 100):
+        rows[i][0] = 'changed'
+    sheet.sync_values(SHEET_NAME, rows)
+    return 1
+
+# name -> (function, uses cache)
+SCENARIOS = OrderedDict([
+    ('metadata', (bench_metadata, False)),
+    ('single_reads', (bench_single_reads, False)),
+    ('batch_read', (bench_batch_read, False)),
+    ('windowed_read', (bench_windowed_read, False)),
+    ('grid_stream', (bench_grid_stream, False)),
+    ('cached_reads', (bench_cached_reads, True)),
+    ('large_write', (bench_large_write, False)),
+    ('appends', (bench_appends, False)),
+    ('sync', (bench_sync, False)),
+])
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile
+
+    Args:
+        values (list): Observed values
+        q (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile. Returns 0.0 if {values} is empty.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def _prepare(name: str, server: FakeSheetsServer, credential_path: str, options) -> tuple:
+    """Seed the spreadsheet and create a Sheet whose token is already fetched"""
+    server.add_spreadsheet(SPREADSHEET_ID, {SHEET_NAME: make_rows(options.rows, options.cols)})
+
+    metrics = RequestMetrics()
+    latencies = []
+    metrics.add_hook(lambda event: latencies.append(event['latency']))
+    sheet = Sheet(
+        SPREADSHEET_ID,
+        credential_path=credential_path,
+        scheduler=QuotaScheduler(read_rate=options.rate, write_rate=options.rate, base_delay=options.base_delay),
+        cache=ValuesCache() if SCENARIOS[name][1] else None,
+        metrics=metrics,
+        client_options={'api_endpoint': server.url}
+    )
+    sheet.get_sheet_properties(SHEET_NAME)
+    server.reset_stats()
+    latencies.clear()
+    return sheet, metrics, latencies
+
+def run_scenario(name: str, server: FakeSheetsServer, credential_path: str, options) -> dict:
+    """Run a scenario against a freshly seeded spreadsheet
+
+    The scenario runs twice: once timed, and once under tracemalloc for peak memory,
+    since tracing allocations slows the client down considerably.
+
+    Args:
+        name (str): Key of SCENARIOS
+        server (FakeSheetsServer): Running fake API server
+        credential_path (str): Service account file issued by the server
+        options (argparse.Namespace): Benchmark options
+
+    Returns:
+        dict: Report of the scenario
+    """
+    func = SCENARIOS[name][0]
+
+    sheet, metrics, latencies = _prepare(name, server, credential_path, options)
+    started = time.perf_counter()
+    operations = func(sheet, options)
+    elapsed = time.perf_counter() - started
+    stats = dict(server.stats)
+    retries = metrics.snapshot()['total']['retries']
+
+    peak = 0
+    if options.memory:
+        sheet, _, _ = _prepare(name, server, credential_path, options)
+        tracemalloc.start()
+        func(sheet, options)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return OrderedDict([
+        ('scenario', name),
+        ('operations', operations),
+        ('requests', stats['requests']),
+        ('seconds', round(elapsed, 4)),
+        ('requests_per_second', round(stats['requests'] / elapsed, 2) if elapsed > 0 else 0.0),
+        ('p50_ms', round(percentile(latencies, 50) * 1000, 2)),
+        ('p99_ms', round(percentile(latencies, 99) * 1000, 2)),
+        ('bytes_sent', stats['bytes_received']),
+        ('bytes_received', stats['bytes_sent']),
+        ('throttled', stats['throttled']),
+        ('errors', stats['errors']),
+        ('retries', retries),
+        ('peak_memory_kb', round(peak / 1024, 1)),
+    ])
+
+def format_table(reports: list) -> str:
+    columns = list(reports[0].keys())
+    widths = [max(len(c), *(len(str(r[c])) for r in reports)) for c in columns]
+    lines = ['  '.join(c.rjust(w) for c, w in zip(columns, widths))]
+    for report in reports:
+        lines.append('  '.join(str(report[c]).rjust(w) for c, w in zip(columns, widths)))
+    return '\n'.join(lines)
+
+def main(argv: list=None) -> int:
+    """Run the benchmark scenarios and print a report
+
+    Args:
+        argv (list, optional): Command line arguments. Defaults to None and uses sys.argv.
+
+    Returns:
+        int: Exit status
+    """
+    parser = argparse.ArgumentParser(description='Benchmark datacommon.google_app against a local fake Sheets API')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='scenario to run, repeatable. Defaults to all')
+    parser.add_argument('--rows', type=int, default=2000, help='rows of the seeded sheet')
+    parser.add_argument('--cols', type=int, default=10, help='columns of the seeded sheet')
+    parser.add_argument('--repeat', type=int, default=20, help='operations of repeated scenarios')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random seconds added to latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of 503 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='probability of 429 responses')
+    parser.add_argument('--quota', type=int, default=None, help='requests allowed per minute by the server')
+    parser.add_argument('--rate', type=float, default=1000.0, help='client side requests per second of each quota bucket')
+    parser.add_argument('--base-delay', type=float, default=0.05, help='first backoff delay of retries in seconds')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip the peak memory pass')
+    parser.add_argument('--json', action='store_true', help='print reports as JSON')
+    options = parser.parse_args(argv)
+
+    server = FakeSheetsServer(
+        latency=options.latency,
+        jitter=options.jitter,
+        error_rate=options.error_rate,
+        throttle_rate=options.throttle_rate,
+        quota_per_minute=options.quota
+    )
+    with server, tempfile.TemporaryDirectory() as tmpdir:
+        credential_path = os.path.join(tmpdir, 'credentials.json')
+        write_credentials(credential_path, server.url + 'token')
+        reports = [
+            run_scenario(name, server, credential_path, options)
+            for name in (options.scenario or SCENARIOS)
+        ]
+
+    if options.json:
+        json.dump(reports, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        print(format_table(reports))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
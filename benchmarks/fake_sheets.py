@@ -0,0 +1,348 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+__all__ = [
+    'FakeSheetsServer',
+    'write_credentials',
+]
+
+A1_PATTERN = re.compile(r'^(?:(.+)!)?([A-Za-z]*)(\d*)(?::([A-Za-z]*)(\d*))?$')
+
+def _column_number(letters):
+    column = 0
+    for letter in letters.upper():
+        column = column * 26 + ord(letter) - ord('A') + 1
+    return column
+
+def _parse_range(range_notation):
+    """Split a A1 notation into (sheet_name, top, left, bottom, right), 0-based and end-exclusive"""
+    sheet_name, start_column, start_row, end_column, end_row = A1_PATTERN.match(range_notation).groups()
+    if sheet_name is not None and sheet_name[:1] == sheet_name[-1:] == "'":
+        sheet_name = sheet_name[1:-1].replace("''", "'")
+
+    top = int(start_row) - 1 if start_row else 0
+    left = _column_number(start_column) - 1 if start_column else 0
+    if end_row:
+        bottom = int(end_row)
+    elif end_column or not start_row:
+        bottom = None
+    else:
+        bottom = top + 1
+    if end_column:
+        right = _column_number(end_column)
+    elif start_column and start_row and not end_row:
+        right = left + 1
+    else:
+        right = None
+    return sheet_name, top, left, bottom, right
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which Nagle's algorithm delays by ~40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode()
+        self.server.fake.count_bytes(len(body), sent=True)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        fake = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        fake.count_bytes(len(raw) + len(self.path), sent=False)
+
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        query = parse_qs(url.query)
+        if path.endswith('/token'):
+            return self._send(200, {'access_token': 'fake', 'expires_in': 3600, 'token_type': 'Bearer'})
+
+        body = json.loads(raw) if raw else {}
+
+        status = fake.admit()
+        if status is not None:
+            return self._send(status, {'error': {'code': status, 'message': 'injected error'}})
+
+        with fake.lock:
+            status, data = fake.dispatch(self.command, path, query, body)
+        self._send(status, data)
+
+    do_GET = do_PUT = do_POST = _handle
+
+class FakeSheetsServer(object):
+    def __init__(self, latency: float=0.0, jitter: float=0.0, error_rate: float=0.0,
+                 throttle_rate: float=0.0, quota_per_minute: int=None, host: str='127.0.0.1', port: int=0):
+        """Local HTTP server imitating the Sheets, Drive and OAuth token endpoints
+
+        Spreadsheets are kept in memory. Every API request sleeps for {latency} plus a random
+        {jitter}, may fail with 503 or 429 at the given rates, and fails with 429 once more than
+        {quota_per_minute} requests arrived within the last minute.
+
+        Args:
+            latency (float, optional): Seconds added to every API request. Defaults to 0.0.
+            jitter (float, optional): Upper bound of random seconds added to {latency}. Defaults to 0.0.
+            error_rate (float, optional): Probability of answering 503. Defaults to 0.0.
+            throttle_rate (float, optional): Probability of answering 429. Defaults to 0.0.
+            quota_per_minute (int, optional): Requests allowed per sliding minute. Defaults to None and unlimited.
+            host (str, optional): Address to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): Port to listen on. Defaults to 0 and picks a free port.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.quota_per_minute = quota_per_minute
+
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+        self.versions = {}
+        self.__window = deque()
+        self.__stats_lock = threading.Lock()
+        self.reset_stats()
+
+        self.__server = ThreadingHTTPServer((host, port), _Handler)
+        self.__server.daemon_threads = True
+        self.__server.fake = self
+        self.__thread = None
+
+    @property
+    def url(self) -> str:
+        """Root URL of the server, usable as api_endpoint
+
+        Returns:
+            str: URL ending with '/'
+        """
+        host, port = self.__server.server_address[:2]
+        return 'http://{}:{}/'.format(host, port)
+
+    def start(self):
+        """Serve requests on a background thread
+
+        Returns:
+            FakeSheetsServer: This object
+        """
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port
+        """
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def reset_stats(self):
+        """Clear request and byte counters
+        """
+        with self.__stats_lock:
+            self.stats = {
+                'requests': 0,
+                'errors': 0,
+                'throttled': 0,
+                'bytes_received': 0,
+                'bytes_sent': 0,
+            }
+
+    def count_bytes(self, size: int, sent: bool):
+        with self.__stats_lock:
+            self.stats['bytes_sent' if sent else 'bytes_received'] += size
+
+    def admit(self) -> int:
+        """Apply latency and fault injection to an API request
+
+        Returns:
+            int: Status code of an injected error. Returns None if the request should be served.
+        """
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        now = time.monotonic()
+        with self.__stats_lock:
+            self.stats['requests'] += 1
+            while self.__window and now - self.__window[0] > 60:
+                self.__window.popleft()
+            if self.quota_per_minute is not None and len(self.__window) >= self.quota_per_minute:
+                self.stats['throttled'] += 1
+                return 429
+            self.__window.append(now)
+
+            if random.random() < self.throttle_rate:
+                self.stats['throttled'] += 1
+                return 429
+            if random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 503
+        return None
+
+    def add_spreadsheet(self, spreadsheet_id: str, sheets: dict):
+        """Create a spreadsheet
+
+        Args:
+            spreadsheet_id (str): The id of the spreadsheet
+            sheets (dict): A list of rows keyed by sheet title
+        """
+        with self.lock:
+            self.spreadsheets[spreadsheet_id] = {
+                title: [list(row) for row in rows]
+                for title, rows in sheets.items()
+            }
+            self.versions[spreadsheet_id] = 1
+
+    def dispatch(self, method: str, path: str, query: dict, body: dict) -> tuple:
+        """Serve an API request against the in-memory spreadsheets
+
+        Returns:
+            tuple: A tuple consists of (status, response data)
+        """
+        match = re.search(r'files/([^/]+)$', path)
+        if match:
+            spreadsheet_id = match.group(1)
+            if spreadsheet_id not in self.versions:
+                return 404, {'error': {'code': 404}}
+            return 200, {'version': str(self.versions[spreadsheet_id])}
+
+        match = re.match(r'^/v4/spreadsheets/([^/:]+)(.*)$', path)
+        if match is None or match.group(1) not in self.spreadsheets:
+            return 404, {'error': {'code': 404}}
+
+        spreadsheet_id, rest = match.groups()
+        book = self.spreadsheets[spreadsheet_id]
+        if rest == '' and method == 'GET':
+            return 200, self._metadata(spreadsheet_id, book, query)
+        if rest == ':batchUpdate':
+            self.versions[spreadsheet_id] += 1
+            return 200, self._batch_update(spreadsheet_id, book, body)
+        if rest == '/values:batchUpdate':
+            self.versions[spreadsheet_id] += 1
+            cells = sum(self._write(book, data['range'], data['values']) for data in body.get('data', []))
+            return 200, {'spreadsheetId': spreadsheet_id, 'totalUpdatedCells': cells}
+        if rest.startswith('/values/'):
+            _range = rest[len('/values/'):]
+            if _range.endswith(':append'):
+                self.versions[spreadsheet_id] += 1
+                return 200, self._append(book, _range[:-len(':append')], body['values'])
+            if method == 'PUT':
+                self.versions[spreadsheet_id] += 1
+                return 200, {'updatedCells': self._write(book, _range, body['values'])}
+            return 200, {'range': _range, 'majorDimension': 'ROWS', 'values': self._read(book, _range)}
+        return 404, {'error': {'code': 404}}
+
+    def _sheet(self, book, sheet_name):
+        if sheet_name is None:
+            sheet_name = next(iter(book))
+        return book.setdefault(sheet_name, [])
+
+    def _read(self, book, _range):
+        sheet_name, top, left, bottom, right = _parse_range(_range)
+        rows = self._sheet(book, sheet_name)[top:bottom]
+        values = [row[left:right] for row in rows]
+        for row in values:
+            while row and row[-1] in (None, ''):
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _write(self, book, _range, values):
+        sheet_name, top, left, _, _ = _parse_range(_range)
+        return self._write_at(self._sheet(book, sheet_name), top, left, values)
+
+    def _write_at(self, rows, top, left, values):
+        for i, new_row in enumerate(values):
+            while len(rows) <= top + i:
+                rows.append([])
+            row = rows[top + i]
+            while len(row) < left + len(new_row):
+                row.append('')
+            row[left:left + len(new_row)] = new_row
+        return sum(len(row) for row in values)
+
+    def _append(self, book, _range, values):
+        sheet_name, _, left, _, _ = _parse_range(_range)
+        rows = self._sheet(book, sheet_name)
+        cells = self._write_at(rows, len(rows), left, values)
+        return {'updates': {'updatedRows': len(values), 'updatedCells': cells}}
+
+    def _metadata(self, spreadsheet_id, book, query):
+        sheets = []
+        for index, (title, rows) in enumerate(book.items()):
+            sheet = {
+                'properties': {
+                    'sheetId': index,
+                    'title': title,
+                    'index': index,
+                    'sheetType': 'GRID',
+                    'gridProperties': {
+                        'rowCount': max(1000, len(rows)),
+                        'columnCount': max([26] + [len(row) for row in rows]),
+                    }
+                }
+            }
+            if query.get('includeGridData', ['false'])[0] == 'true':
+                sheet['data'] = [{
+                    'rowData': [
+                        {'values': [{'formattedValue': str(v), 'effectiveValue': {'stringValue': str(v)}} for v in row]}
+                        for row in rows
+                    ]
+                }]
+            sheets.append(sheet)
+        return {'spreadsheetId': spreadsheet_id, 'sheets': sheets}
+
+    def _batch_update(self, spreadsheet_id, book, body):
+        replies = []
+        for request in body.get('requests', []):
+            if 'addSheet' in request:
+                title = request['addSheet'].get('properties', {}).get('title', 'Sheet{}'.format(len(book) + 1))
+                book.setdefault(title, [])
+                replies.append({'addSheet': {'properties': {'sheetId': len(book) - 1, 'title': title}}})
+            else:
+                replies.append({})
+        return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+def write_credentials(path: str, token_uri: str):
+    """Write a throwaway service account file whose tokens are issued by {token_uri}
+
+    Args:
+        path (str): File path of the credentials
+        token_uri (str): OAuth token endpoint, e.g. FakeSheetsServer.url + 'token'
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+    with open(path, 'w') as f:
+        json.dump({
+            'type': 'service_account',
+            'project_id': 'fake-project',
+            'private_key_id': 'fake',
+            'private_key': pem,
+            'client_email': 'bench@fake-project.iam.gserviceaccount.com',
+            'client_id': '0',
+            'token_uri': token_uri,
+        }, f)
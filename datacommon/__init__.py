@@ -5,8 +5,10 @@ __ROOTDIR = "/".join(os.path.abspath(__file__).split("/")[:-1])
 
 from . import db
 from . import google_app
+from . import pipeline
 
 __all__ = [
     'db',
     'google_app',
+    'pipeline',
 ]
@@ -174,6 +174,8 @@ class MySQLQuery(Query):
             cursorclass = pymysql.cursors.DictCursor
         else:
             cursorclass = None
+        self.dict_cursor = (dict_cursor is True)
+        self.description = None
 
         if hostname in factory_methods:
             self.db_connect = getattr(MySQLDBConnect, '{}Connect'.format(hostname))()
@@ -242,6 +244,57 @@ class MySQLQuery(Query):
         else:
             return self.db_connect.cursor.fetchall()
 
+    def iter_query(self, sql: str, args: tuple=None, chunk_size: int=1000):
+        """Send SQL selection to database and stream the result in chunks of rows.\n
+        Rows are fetched with an unbuffered server-side cursor, so memory stays proportional to {chunk_size}.
+        Column names of the result are available in `description` once the first chunk is yielded.
+
+        Args:
+            sql (str): SQL query string
+            args (tuple, optional): Query parameters to escape. Defaults to None.
+            chunk_size (int, optional): Number of rows per chunk. Defaults to 1000.
+
+        Yields:
+            list: A chunk of query results
+        """
+        if args is None:
+            args = tuple()
+
+        if not self.is_connection_open():
+            self.reconnect()
+
+        if self.dict_cursor:
+            cursorclass = pymysql.cursors.SSDictCursor
+        else:
+            cursorclass = pymysql.cursors.SSCursor
+
+        cursor = self.db_connect.connection.cursor(cursorclass)
+        exhausted = False
+        try:
+            cursor.execute(sql, args)
+            self.description = cursor.description
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    exhausted = True
+                    break
+                yield list(rows)
+        finally:
+            if exhausted:
+                cursor.close()
+            else:
+                self.abort()
+
+    def abort(self):
+        """Drop the connection without reading the rest of an unbuffered result.\n
+        Closing a server-side cursor early reads every remaining row, so a stream stopped
+        midway is aborted by closing the connection instead. The next query reconnects.
+        """
+        try:
+            self.db_connect.connection.close()
+        except pymysql.err.Error:
+            pass
+
 def factory_query(query_type: str, *args, **kwarg) -> Query:
     """Factory function for creating Query instance
 
@@ -1,5 +1,23 @@
 from .sheets import *
+from .ratelimit import *
+from .columnar import *
+from .diff import *
+from .cache import *
+from .async_sheets import *
+from .grid import *
+from .metrics import *
 
 __all__ = [
     'Sheet',
+    'AsyncSheet',
+    'AsyncSheetsClient',
+    'RateLimiter',
+    'QuotaScheduler',
+    'RequestMetrics',
+    'Histogram',
+    'decode_columns',
+    'diff_blocks',
+    'ValuesCache',
+    'GridRow',
+    'iter_grid_rows',
 ]
\ No newline at end of file
@@ -0,0 +1,335 @@
+import asyncio
+import json
+import os
+from urllib.parse import quote
+
+import aiohttp
+import google_auth_httplib2
+import httplib2
+from google.oauth2 import service_account
+from googleapiclient.errors import HttpError
+
+from .ratelimit import IDEMPOTENT_METHODS, QuotaScheduler
+
+__all__ = [
+    'AsyncSheetsClient',
+    'AsyncSheet',
+]
+
+class AsyncSheetsClient(object):
+    BASE_URL = 'https://sheets.googleapis.com/v4/'
+
+    def __init__(self, credential_path: str=None, scope: list=None, max_concurrency: int=10,
+                 base_url: str=None, scheduler: QuotaScheduler=None):
+        """Asyncio client of Google Spreadsheets shared by many AsyncSheet objects
+
+        All sheets created from one client share a keep-alive connection pool, a single
+        credential whose token is refreshed once for every waiting request, and a limit of
+        concurrent requests.
+
+        Args:
+            credential_path (str, optional): Google Application Credentials file path. Defaults to None and uses environ GOOGLE_APPLICATION_CREDENTIALS.
+            scope (list, optional): Google Spreadsheets auth scope. Defaults to None.
+            max_concurrency (int, optional): Maximum number of requests in flight. Defaults to 10.
+            base_url (str, optional): Root URL of the Sheets API, e.g. of a local fake endpoint. Defaults to None and uses BASE_URL.
+            scheduler (QuotaScheduler, optional): Rate limiter of API requests. Defaults to None and uses the one shared by the credential's account.
+        """
+        if credential_path is None:
+            credential_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', '')
+
+        if scope is None:
+            scope = [
+                'https://www.googleapis.com/auth/drive',
+                'https://www.googleapis.com/auth/drive.file',
+                'https://www.googleapis.com/auth/spreadsheets',
+            ]
+
+        self.__cred = service_account.Credentials.from_service_account_file(
+            credential_path,
+            scopes=scope
+        )
+
+        if base_url is None:
+            base_url = self.BASE_URL
+        self.__base_url = base_url.rstrip('/') + '/'
+
+        if scheduler is None:
+            scheduler = QuotaScheduler.shared(self.__cred.project_id, self.__cred.service_account_email)
+        self.__scheduler = scheduler
+
+        self.max_concurrency = max_concurrency
+        self.__session = None
+        self.__semaphore = None
+        self.__token_lock = None
+
+    @property
+    def credentials(self):
+        """Credentials used to authorize requests
+
+        Returns:
+            Credentials: The service account Credentials object
+        """
+        return self.__cred
+
+    @property
+    def scheduler(self):
+        """Rate limiter every API request of this client passes through
+
+        Returns:
+            QuotaScheduler: The QuotaScheduler object
+        """
+        return self.__scheduler
+
+    def sheet(self, sheet_id: str):
+        """Create an AsyncSheet sharing this client
+
+        Args:
+            sheet_id (str): The id of the Google Spreadsheets
+
+        Returns:
+            AsyncSheet: The AsyncSheet object
+        """
+        return AsyncSheet(sheet_id, client=self)
+
+    def _session(self) -> aiohttp.ClientSession:
+        # Created lazily so that the session, lock and semaphore bind to the running loop
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.__session = aiohttp.ClientSession(connector=connector)
+            self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.__token_lock = asyncio.Lock()
+        return self.__session
+
+    async def _authorization(self) -> str:
+        """Value of the Authorization header, refreshing the token once if it expired
+
+        Returns:
+            str: Bearer token
+        """
+        async with self.__token_lock:
+            if not self.__cred.valid:
+                loop = asyncio.get_event_loop()
+                request = google_auth_httplib2.Request(httplib2.Http())
+                await loop.run_in_executor(None, self.__cred.refresh, request)
+        return 'Bearer {}'.format(self.__cred.token)
+
+    async def request(self, method: str, path: str, params: list=None, body: dict=None) -> dict:
+        """Send a request to the Sheets API
+
+        Args:
+            method (str): HTTP method
+            path (str): Path relative to the API root URL
+            params (list, optional): A list of (key, value) query parameters. Defaults to None.
+            body (dict, optional): JSON body. Defaults to None.
+
+        Raises:
+            HttpError: Raised if the request failed with a non-retryable status or retries are exhausted
+
+        Returns:
+            dict: Response data as dict from API
+        """
+        session = self._session()
+        limiter = self.__scheduler.limiter_for_method(method)
+        url = self.__base_url + path
+        attempt = 0
+        while True:
+            wait = limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            async with self.__semaphore:
+                headers = {'Authorization': await self._authorization()}
+                async with session.request(method, url, params=params, json=body, headers=headers) as resp:
+                    content = await resp.read()
+                    status = resp.status
+                    reason = resp.reason
+
+            if status < 400:
+                limiter.on_success()
+                return json.loads(content) if content else {}
+
+            error = HttpError(httplib2.Response({'status': status, 'reason': reason}), content, uri=url)
+            # 5xx may follow an applied append or batchUpdate, only resend idempotent methods
+            if not limiter.is_retryable(error, idempotent=method.upper() in IDEMPOTENT_METHODS):
+                raise error
+            limiter.on_throttled()
+            if attempt >= limiter.max_retries:
+                raise error
+            await asyncio.sleep(limiter.backoff_delay(attempt))
+            attempt += 1
+
+    async def close(self):
+        """Close the connection pool
+        """
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+class AsyncSheet(object):
+    def __init__(self, sheet_id: str, credential_path: str=None, scope: list=None, client: AsyncSheetsClient=None):
+        """Asyncio counterpart of Sheet
+
+        Args:
+            sheet_id (str): The id of the Google Spreadsheets
+            credential_path (str, optional): Google Application Credentials file path. Ignored if {client} is given. Defaults to None.
+            scope (list, optional): Google Spreadsheets auth scope. Ignored if {client} is given. Defaults to None.
+            client (AsyncSheetsClient, optional): Client to share connections with. Defaults to None and creates one, which is closed by close.
+        """
+        self.__owns_client = client is None
+        if client is None:
+            client = AsyncSheetsClient(credential_path=credential_path, scope=scope)
+
+        self.__id = sheet_id
+        self.__client = client
+
+    @property
+    def client(self):
+        """Client sending the requests of this object
+
+        Returns:
+            AsyncSheetsClient: The AsyncSheetsClient object
+        """
+        return self.__client
+
+    async def close(self):
+        """Close the connection pool of the client created by this object. A shared client is left open.
+        """
+        if self.__owns_client:
+            await self.__client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @staticmethod
+    def format_range(sheet_name, range_notation):
+        """Construct a A1 notation for Google Spreadsheet
+
+        Args:
+            sheet_name (str): Name of the sheet
+            range_notation (str): A1 notation without specific sheet name
+
+        Returns:
+            str: A1 notation with sheet name specified
+        """
+        return "'{}'!{}".format(sheet_name, range_notation)
+
+    def _values_path(self, _range: str, suffix: str='') -> str:
+        return 'spreadsheets/{}/values/{}{}'.format(self.__id, quote(_range, safe=''), suffix)
+
+    async def fetch_sheet_metadata(self, params: dict=None) -> dict:
+        """Returns metadata of the spreadsheets
+
+        Args:
+            params (dict, optional): Parameters passing to the API. Defaults to None.
+
+        Returns:
+            dict: Response data as dict from API
+        """
+        if params is None:
+            params = {
+                'includeGridData': False
+            }
+
+        query = [('includeGridData', 'true' if params.get('includeGridData') else 'false')]
+        for _range in params.get('ranges') or []:
+            query.append(('ranges', _range))
+        if params.get('fields') is not None:
+            query.append(('fields', params['fields']))
+
+        return await self.__client.request('GET', 'spreadsheets/{}'.format(self.__id), params=query)
+
+    async def _spreadsheet_batchUpdate(self, requests: list) -> dict:
+        """Wrapper method for sending Spreadsheets batchUpdate request
+
+        Args:
+            requests (list): A list consists of requests
+
+        Returns:
+            dict: A dict of the API responses
+        """
+        body = {
+            'requests': requests
+        }
+        return await self.__client.request(
+            'POST',
+            'spreadsheets/{}:batchUpdate'.format(self.__id),
+            body=body
+        )
+
+    async def get_values_by_range(self, _range: str, valueRenderOption: str=None, dateTimeRenderOption: str=None) -> list:
+        """Get values from sheet within range specified
+
+        Args:
+            _range (str): A1 notation of the range
+            valueRenderOption (str, optional): Spreadsheets API parameter. Defaults to None and uses 'FORMATTED_VALUE'.
+            dateTimeRenderOption (str, optional): Spreadsheets API parameter. Defaults to None and uses 'SERIAL_NUMBER'.
+
+        Raises:
+            TypeError: if type of {_range} is not str
+
+        Returns:
+            list: Values from the range
+        """
+        if not isinstance(_range, (str,)):
+            raise TypeError('Type of argument "_range" is invalid')
+
+        query = []
+        if valueRenderOption is not None:
+            query.append(('valueRenderOption', valueRenderOption))
+        if dateTimeRenderOption is not None:
+            query.append(('dateTimeRenderOption', dateTimeRenderOption))
+
+        results = await self.__client.request('GET', self._values_path(_range), params=query)
+        return results.get('values', [])
+
+    async def update_values_by_range(self, _range: str, values: list, valueInputOption: str='USER_ENTERED') -> int:
+        """Update values within specific range
+
+        Args:
+            _range (str): A1 notation of the range to be updated
+            values (list): A list of rows of new values
+            valueInputOption (str, optional): Spreadsheets API parameters. Defaults to 'USER_ENTERED'.
+
+        Returns:
+            int: The number of cells updated
+        """
+        body = {
+            'values': values
+        }
+        results = await self.__client.request(
+            'PUT',
+            self._values_path(_range),
+            params=[('valueInputOption', valueInputOption)],
+            body=body
+        )
+        return results.get('updatedCells')
+
+    async def append_values(self, _range: str, values: list, valueInputOption: str='USER_ENTERED') -> dict:
+        """Append new rows with range column specified
+
+        Args:
+            _range (str): A1 notation of the columns to append
+            values (list): A list of rows to append
+            valueInputOption (str, optional): Spreadsheets API parameter. Defaults to 'USER_ENTERED'.
+
+        Returns:
+            dict: Information about the updates that were applied
+        """
+        body = {
+            'values': values
+        }
+        results = await self.__client.request(
+            'POST',
+            self._values_path(_range, ':append'),
+            params=[('valueInputOption', valueInputOption)],
+            body=body
+        )
+        return results.get('updates')
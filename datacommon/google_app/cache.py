@@ -0,0 +1,136 @@
+import copy
+import json
+import shelve
+import threading
+import time
+from collections import OrderedDict
+
+__all__ = [
+    'ValuesCache',
+]
+
+class ValuesCache(object):
+    def __init__(self, maxsize: int=128, ttl: float=300.0, path: str=None):
+        """LRU cache of range values validated against the spreadsheet revision
+
+        An entry is fresh while the revision of the spreadsheet equals the one stored with it.
+        If the revision could not be fetched, the entry is fresh for {ttl} seconds instead.
+
+        Args:
+            maxsize (int, optional): Maximum number of cached ranges. Defaults to 128.
+            ttl (float, optional): Seconds an entry stays fresh without a revision. Defaults to 300.0.
+            path (str, optional): File path of a shelve database to persist entries. Defaults to None.
+
+        Raises:
+            ValueError: Raised if {maxsize} is not positive
+        """
+        if maxsize < 1:
+            raise ValueError('argument "maxsize" should be positive')
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        self.__shelf = shelve.open(path) if path is not None else None
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @staticmethod
+    def make_key(spreadsheet_id: str, _range: str, *options) -> str:
+        """Build the key of a cached range
+
+        Args:
+            spreadsheet_id (str): The id of the Google Spreadsheets
+            _range (str): A1 notation of the range
+            options: Render options the values were read with
+
+        Returns:
+            str: Cache key
+        """
+        return json.dumps([spreadsheet_id, _range] + list(options))
+
+    def __store(self, key: str, entry: dict):
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+        if self.__shelf is not None:
+            self.__shelf[key] = entry
+
+        while len(self.__entries) > self.maxsize:
+            evicted, _ = self.__entries.popitem(last=False)
+            if self.__shelf is not None and evicted in self.__shelf:
+                del self.__shelf[evicted]
+
+    def __discard(self, key: str):
+        self.__entries.pop(key, None)
+        if self.__shelf is not None and key in self.__shelf:
+            del self.__shelf[key]
+
+    def get(self, key: str, revision: str=None) -> list:
+        """Get cached values if they are still fresh
+
+        Args:
+            key (str): Cache key
+            revision (str, optional): Current revision of the spreadsheet. Defaults to None and falls back to TTL.
+
+        Returns:
+            list: A copy of the cached values. Returns None if missing or stale.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None and self.__shelf is not None:
+                entry = self.__shelf.get(key)
+                if entry is not None:
+                    self.__store(key, entry)
+            if entry is None:
+                return None
+
+            if revision is not None and entry['revision'] is not None:
+                fresh = (entry['revision'] == revision)
+            else:
+                fresh = (time.time() - entry['stored_at'] < self.ttl)
+
+            if not fresh:
+                self.__discard(key)
+                return None
+
+            self.__entries.move_to_end(key)
+            return copy.deepcopy(entry['values'])
+
+    def put(self, key: str, values: list, revision: str=None):
+        """Store a copy of values read at a revision
+
+        Args:
+            key (str): Cache key
+            values (list): Values of the range
+            revision (str, optional): Revision of the spreadsheet fetched before reading the values. Defaults to None.
+        """
+        with self.__lock:
+            self.__store(key, {
+                'values': copy.deepcopy(values),
+                'revision': revision,
+                'stored_at': time.time(),
+            })
+
+    def invalidate(self, spreadsheet_id: str=None):
+        """Drop cached entries
+
+        Args:
+            spreadsheet_id (str, optional): Only drop entries of this spreadsheet. Defaults to None and drops all.
+        """
+        with self.__lock:
+            keys = set(self.__entries)
+            if self.__shelf is not None:
+                keys.update(self.__shelf.keys())
+
+            for key in keys:
+                if spreadsheet_id is None or json.loads(key)[0] == spreadsheet_id:
+                    self.__discard(key)
+
+    def close(self):
+        """Close the shelve database if entries are persisted
+        """
+        with self.__lock:
+            if self.__shelf is not None:
+                self.__shelf.close()
+                self.__shelf = None
@@ -0,0 +1,163 @@
+import numpy as np
+
+__all__ = [
+    'pad_rows',
+    'infer_dtype',
+    'decode_column',
+    'decode_columns',
+]
+
+# Day zero of Google Sheets serial numbers
+SERIAL_EPOCH = np.datetime64('1899-12-30T00:00:00', 'ms')
+MS_PER_DAY = 86400000
+
+DTYPES = ('bool', 'int', 'float', 'datetime', 'str')
+
+def pad_rows(rows: list, width: int=None) -> np.ndarray:
+    """Pad ragged rows returned by the Values API into a 2-D object array
+
+    Args:
+        rows (list): A list of rows of values
+        width (int, optional): Number of columns. Defaults to None and uses the longest row.
+
+    Returns:
+        numpy.ndarray: Object array in (rows, columns) shape, missing cells are None
+    """
+    if width is None:
+        width = max((len(row) for row in rows), default=0)
+
+    grid = np.full((len(rows), width), None, dtype=object)
+    for i, row in enumerate(rows):
+        row = row[:width]
+        grid[i, :len(row)] = row
+    return grid
+
+def infer_dtype(values: np.ndarray) -> str:
+    """Infer the dtype name of non-null unformatted values
+
+    Args:
+        values (numpy.ndarray): Object array without null cells
+
+    Returns:
+        str: One of 'bool', 'int', 'float' or 'str'
+    """
+    types = set(map(type, values))
+    if not types:
+        return 'float'
+    if types <= {bool}:
+        return 'bool'
+    if types <= {int}:
+        return 'int'
+    if types <= {int, float}:
+        return 'float'
+    return 'str'
+
+def _to_int(value) -> int:
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError('non-integral value {!r}'.format(value))
+    return int(value)
+
+def _to_float(value) -> float:
+    if isinstance(value, (bool, np.bool_)):
+        raise TypeError('non-numeric value {!r}'.format(value))
+    return float(value)
+
+def _to_bool(value) -> bool:
+    if not isinstance(value, (bool, np.bool_)):
+        raise TypeError('non-boolean value {!r}'.format(value))
+    return bool(value)
+
+def _coerce(values: np.ndarray, dtype, convert, exact_types: tuple):
+    """Convert values, masking cells that cannot be converted
+
+    A single vectorized cast is used only when every value is one of {exact_types},
+    since astype would silently truncate floats or treat any non-empty string as True.
+    """
+    if all(type(value) in exact_types for value in values):
+        try:
+            return values.astype(dtype), np.zeros(len(values), dtype=bool)
+        except OverflowError:
+            # e.g. ints outside int64, masked cell by cell below
+            pass
+
+    converted = np.zeros(len(values), dtype=dtype)
+    invalid = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        try:
+            converted[i] = convert(value)
+        except (TypeError, ValueError, OverflowError):
+            invalid[i] = True
+    return converted, invalid
+
+def decode_column(column: np.ndarray, dtype: str=None) -> np.ma.MaskedArray:
+    """Convert a column of unformatted values into a typed masked array
+
+    Args:
+        column (numpy.ndarray): Object array of a column, null cells are None or ''
+        dtype (str, optional): One of DTYPES. Defaults to None and infers from values.
+
+    Raises:
+        ValueError: Raised if {dtype} is not supported
+
+    Returns:
+        numpy.ma.MaskedArray: Typed values with null cells masked
+    """
+    mask = np.equal(column, None) | np.equal(column, '')
+    values = column[~mask]
+    if dtype is None:
+        dtype = infer_dtype(values)
+    elif dtype not in DTYPES:
+        raise ValueError('dtype "{}" not supported'.format(dtype))
+
+    if dtype == 'str':
+        data = np.full(len(column), '', dtype=object)
+        data[~mask] = values.astype(str)
+        return np.ma.MaskedArray(data, mask=mask)
+
+    if dtype == 'datetime':
+        serial, invalid = _coerce(values, np.float64, _to_float, (int, float))
+        converted = SERIAL_EPOCH + np.round(serial * MS_PER_DAY).astype('timedelta64[ms]')
+        data = np.full(len(column), np.datetime64('NaT'), dtype='datetime64[ms]')
+    elif dtype == 'float':
+        converted, invalid = _coerce(values, np.float64, _to_float, (int, float))
+        data = np.full(len(column), np.nan, dtype=np.float64)
+    elif dtype == 'int':
+        converted, invalid = _coerce(values, np.int64, _to_int, (int,))
+        data = np.zeros(len(column), dtype=np.int64)
+    else:
+        converted, invalid = _coerce(values, np.bool_, _to_bool, (bool,))
+        data = np.zeros(len(column), dtype=np.bool_)
+
+    data[~mask] = converted
+    mask[np.flatnonzero(~mask)[invalid]] = True
+    return np.ma.MaskedArray(data, mask=mask)
+
+def decode_columns(rows: list, header: bool=True, schema: dict=None) -> dict:
+    """Convert rows of unformatted values into typed columns
+
+    Args:
+        rows (list): A list of rows read with UNFORMATTED_VALUE and SERIAL_NUMBER rendering
+        header (bool, optional): Use the first row as column names. Defaults to True.
+        schema (dict, optional): dtype of columns keyed by column name or position. Defaults to None and infers all.
+
+    Returns:
+        dict: Masked arrays keyed by column name, or by position if there is no header or the header cell is empty
+    """
+    if schema is None:
+        schema = {}
+
+    grid = pad_rows(rows)
+    if header and len(grid):
+        names = [
+            name if name not in (None, '') else j
+            for j, name in enumerate(grid[0])
+        ]
+        grid = grid[1:]
+    else:
+        names = list(range(grid.shape[1]))
+
+    columns = {}
+    for j, name in enumerate(names):
+        dtype = schema.get(name, schema.get(j))
+        columns[name] = decode_column(grid[:, j], dtype)
+    return columns
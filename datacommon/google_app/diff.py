@@ -0,0 +1,79 @@
+__all__ = [
+    'diff_blocks',
+]
+
+def _same(old, new) -> bool:
+    """Compare cells loosely since targets may hold strings of values read back as numbers"""
+    if old is None:
+        old = ''
+    if new is None:
+        new = ''
+    return old == new or str(old) == str(new)
+
+def _changed_runs(old: list, new: list) -> list:
+    """Column spans [start, end) of changed cells in a row"""
+    runs = []
+    start = None
+    width = max(len(old), len(new))
+    for j in range(width):
+        old_cell = old[j] if j < len(old) else ''
+        new_cell = new[j] if j < len(new) else ''
+        if _same(old_cell, new_cell):
+            if start is not None:
+                runs.append((start, j))
+                start = None
+        elif start is None:
+            start = j
+
+    if start is not None:
+        runs.append((start, width))
+    return runs
+
+def diff_blocks(current: list, target: list) -> list:
+    """Compute rectangular blocks of cells to write so that {current} becomes {target}
+
+    Changed cells of each row are grouped into column spans, and spans repeated on
+    consecutive rows are merged into one block. Cells that only exist in {current},
+    including removed rows, are cleared with empty strings.
+
+    Args:
+        current (list): A list of rows currently in the sheet
+        target (list): A list of rows the sheet should contain
+
+    Returns:
+        list: Blocks in {'row', 'column', 'values'} form, with 0-based offsets from the top-left cell of the grid
+    """
+    height = max(len(current), len(target))
+    rows = [
+        _changed_runs(
+            current[i] if i < len(current) else [],
+            target[i] if i < len(target) else []
+        )
+        for i in range(height)
+    ]
+
+    spans = []
+    active = {}
+    for i, runs in enumerate(rows + [[]]):
+        for span, top in list(active.items()):
+            if span not in runs:
+                spans.append((top, i, span))
+                del active[span]
+        for span in runs:
+            active.setdefault(span, i)
+
+    blocks = []
+    for top, bottom, (left, right) in sorted(spans, key=lambda block: (block[0], block[2])):
+        values = []
+        for i in range(top, bottom):
+            row = target[i] if i < len(target) else []
+            values.append([
+                row[j] if j < len(row) and row[j] is not None else ''
+                for j in range(left, right)
+            ])
+        blocks.append({
+            'row': top,
+            'column': left,
+            'values': values,
+        })
+    return blocks
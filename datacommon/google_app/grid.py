@@ -0,0 +1,67 @@
+from collections import namedtuple
+
+import ijson
+from ijson.common import ObjectBuilder
+
+__all__ = [
+    'GridRow',
+    'iter_grid_rows',
+]
+
+GridRow = namedtuple('GridRow', ['sheet', 'row', 'column', 'values'])
+GridRow.__doc__ = """A row of CellData streamed from a grid-data response
+
+Args:
+    sheet (dict): Properties of the sheet the row belongs to
+    row (int): 0-based row index in the sheet
+    column (int): 0-based column index of the first cell
+    values (list): A list of CellData dicts
+"""
+
+SHEET_PREFIX = 'sheets.item'
+PROPERTIES_PREFIX = 'sheets.item.properties'
+DATA_PREFIX = 'sheets.item.data.item'
+ROW_PREFIX = 'sheets.item.data.item.rowData.item'
+
+def iter_grid_rows(stream):
+    """Parse a spreadsheets.get response with grid data incrementally
+
+    Only one sheet's properties and one row are materialized at a time, so memory
+    stays proportional to a row no matter how large the response is.
+
+    Args:
+        stream (file-like): Binary stream of the JSON response
+
+    Yields:
+        GridRow: Rows of every sheet in response order
+    """
+    properties = {}
+    start_row = start_column = index = 0
+    builder = None
+    building = None
+
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == building and event == 'end_map':
+                if building == PROPERTIES_PREFIX:
+                    properties = builder.value
+                else:
+                    yield GridRow(properties, start_row + index, start_column, builder.value.get('values', []))
+                    index += 1
+                builder = None
+            continue
+
+        if event == 'start_map':
+            if prefix == SHEET_PREFIX:
+                properties = {}
+            elif prefix == DATA_PREFIX:
+                start_row = start_column = index = 0
+            elif prefix in (PROPERTIES_PREFIX, ROW_PREFIX):
+                builder = ObjectBuilder()
+                builder.event(event, value)
+                building = prefix
+        elif prefix == DATA_PREFIX + '.startRow':
+            start_row = int(value)
+        elif prefix == DATA_PREFIX + '.startColumn':
+            start_column = int(value)
@@ -0,0 +1,279 @@
+import logging
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+__all__ = [
+    'Histogram',
+    'RequestMetrics',
+]
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram(object):
+    def __init__(self, buckets: tuple=LATENCY_BUCKETS):
+        """Cumulative histogram with fixed bucket upper bounds
+
+        Args:
+            buckets (tuple, optional): Sorted upper bounds of buckets. Defaults to LATENCY_BUCKETS.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """Record a value
+
+        Args:
+            value (float): Observed value
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        """Export the histogram
+
+        Returns:
+            dict: Cumulative counts keyed by upper bound ('+Inf' for the last bucket), with count, sum and max
+        """
+        buckets = {}
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            buckets[str(bound)] = total
+        return {
+            'buckets': buckets,
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+        }
+
+class _RequestRecord(object):
+    """Measures one call of Sheet._exec_request, including its retries"""
+    def __init__(self, metrics, spreadsheet_id: str, request):
+        self.metrics = metrics
+        self.event = {
+            'spreadsheet_id': spreadsheet_id,
+            'method': getattr(request, 'methodId', None) or type(request).__name__,
+            'http_method': getattr(request, 'method', None),
+            'request_bytes': self._size(getattr(request, 'body', None)),
+            'response_bytes': 0,
+            'status': None,
+            'retries': 0,
+            'throttled': 0,
+            'quota_units': 0,
+            'latency': 0.0,
+            'error': None,
+        }
+
+        self.deferred = False
+        postproc = getattr(request, 'postproc', None)
+        if postproc is not None:
+            def measure(resp, content):
+                self.event['status'] = resp.status
+                self.event['response_bytes'] += len(content or b'')
+                return postproc(resp, content)
+            request.postproc = measure
+        elif hasattr(request, 'on_open'):
+            # Streamed responses are recorded once the body has been read and the stream closed
+            request.on_open = self.opened
+
+    @staticmethod
+    def _size(body) -> int:
+        # googleapiclient keeps JSON bodies as str, count encoded bytes rather than characters
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return len(body or b'')
+
+    def opened(self, status: int, stream):
+        """Defer recording of a streamed response until {stream} is closed
+
+        Args:
+            status (int): HTTP status of the response
+            stream (file-like): Response body whose on_close is called with the number of bytes read
+        """
+        self.event['status'] = status
+        self.deferred = True
+        stream.on_close = self.closed
+
+    def closed(self, response_bytes: int):
+        # Latency of a streamed response covers the whole download, not only the headers
+        self.event['latency'] = time.monotonic() - self.started
+        self.event['response_bytes'] += response_bytes
+        self.metrics.record(self.event)
+
+    def retry(self, error: Exception):
+        """Count a retried attempt
+
+        Args:
+            error (Exception): Error that triggered the retry
+        """
+        self.event['retries'] += 1
+        if isinstance(error, HttpError):
+            self.event['status'] = error.resp.status
+            self.event['response_bytes'] += len(error.content or b'')
+            if error.resp.status == 429:
+                self.event['throttled'] += 1
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.event['latency'] = time.monotonic() - self.started
+        if exc is not None:
+            self.event['error'] = type(exc).__name__
+            if isinstance(exc, HttpError):
+                self.event['status'] = exc.resp.status
+                self.event['response_bytes'] += len(exc.content or b'')
+                if exc.resp.status == 429:
+                    self.event['throttled'] += 1
+        # Every attempt sent to the API counts against the per-minute request quota
+        self.event['quota_units'] = self.event['retries'] + 1
+        if exc is None and self.deferred:
+            return False
+        self.metrics.record(self.event)
+        return False
+
+class RequestMetrics(object):
+    __shared = None
+    __shared_lock = threading.Lock()
+
+    def __init__(self, buckets: tuple=LATENCY_BUCKETS):
+        """Aggregated latency, payload, retry and quota metrics of API requests
+
+        Metrics are grouped by spreadsheet id and API method. Hooks added with add_hook are
+        called with the event dict of every request, e.g. to forward it to a tracing system.
+
+        Args:
+            buckets (tuple, optional): Upper bounds in seconds of latency buckets. Defaults to LATENCY_BUCKETS.
+        """
+        self.buckets = buckets
+        self.__lock = threading.Lock()
+        self.__hooks = []
+        self.__stats = {}
+
+    @classmethod
+    def shared(cls):
+        """Process-wide metrics, created on first use
+
+        Returns:
+            RequestMetrics: Metrics shared by every Sheet without its own metrics
+        """
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cls.__shared = cls()
+            return cls.__shared
+
+    def add_hook(self, hook):
+        """Register a callable receiving the event dict of every request
+
+        Args:
+            hook (callable): Function accepting one dict argument
+        """
+        with self.__lock:
+            self.__hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Unregister a hook
+
+        Args:
+            hook (callable): Function registered by add_hook
+        """
+        with self.__lock:
+            self.__hooks.remove(hook)
+
+    def track(self, spreadsheet_id: str, request) -> _RequestRecord:
+        """Context manager measuring the execution of a request
+
+        Args:
+            spreadsheet_id (str): The id of the Google Spreadsheets
+            request (HttpRequest): Request to execute
+
+        Returns:
+            _RequestRecord: Record whose retry method should be called on every retried attempt
+        """
+        return _RequestRecord(self, spreadsheet_id, request)
+
+    def record(self, event: dict):
+        """Aggregate an event and pass it to hooks
+
+        Errors raised by hooks are logged and never propagate to the request.
+
+        Args:
+            event (dict): Measurements of one request
+        """
+        key = (event['spreadsheet_id'], event['method'])
+        with self.__lock:
+            stats = self.__stats.get(key)
+            if stats is None:
+                stats = self.__stats[key] = {
+                    'count': 0,
+                    'errors': 0,
+                    'retries': 0,
+                    'throttled': 0,
+                    'quota_units': 0,
+                    'request_bytes': 0,
+                    'response_bytes': 0,
+                    'latency': Histogram(self.buckets),
+                }
+            stats['count'] += 1
+            stats['errors'] += 1 if event['error'] is not None else 0
+            for name in ('retries', 'throttled', 'quota_units', 'request_bytes', 'response_bytes'):
+                stats[name] += event[name]
+            stats['latency'].observe(event['latency'])
+            hooks = list(self.__hooks)
+
+        for hook in hooks:
+            try:
+                hook(dict(event))
+            except Exception:
+                logger.exception('request metrics hook %r failed', hook)
+
+    def snapshot(self) -> dict:
+        """Export the aggregated metrics as JSON serializable dict
+
+        Returns:
+            dict: Stats in {spreadsheet_id: {method: stats}} form under 'spreadsheets', and totals under 'total'
+        """
+        spreadsheets = {}
+        total = {
+            'count': 0,
+            'errors': 0,
+            'retries': 0,
+            'throttled': 0,
+            'quota_units': 0,
+            'request_bytes': 0,
+            'response_bytes': 0,
+        }
+        with self.__lock:
+            for (spreadsheet_id, method), stats in self.__stats.items():
+                exported = dict(stats)
+                exported['latency'] = stats['latency'].snapshot()
+                spreadsheets.setdefault(spreadsheet_id, {})[method] = exported
+                for name in total:
+                    total[name] += stats[name]
+        return {
+            'spreadsheets': spreadsheets,
+            'total': total,
+        }
+
+    def reset(self):
+        """Drop the aggregated metrics
+        """
+        with self.__lock:
+            self.__stats = {}
@@ -0,0 +1,298 @@
+import math
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+__all__ = [
+    'RateLimiter',
+    'QuotaScheduler',
+]
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+# A 5xx may arrive after the server applied the request, so only these are retried on it
+IDEMPOTENT_METHODS = ('GET', 'PUT')
+
+class RateLimiter(object):
+    def __init__(self, rate: float, burst: int=None, min_rate: float=None, max_retries: int=5,
+                 base_delay: float=1.0, max_delay: float=64.0):
+        """Adaptive token bucket shared by every request of one quota bucket
+
+        The bucket refills at the current rate, which is halved whenever the API answers with
+        429 or 5xx and climbs back towards {rate} on every success (AIMD).
+
+        Args:
+            rate (float): Maximum sustained requests per second
+            burst (int, optional): Bucket capacity. Defaults to None and uses max(1, rate).
+            min_rate (float, optional): Lower bound of the adapted rate. Defaults to None and uses rate / 32.
+            max_retries (int, optional): Retries of a throttled request before giving up. Defaults to 5.
+            base_delay (float, optional): First backoff delay in seconds. Defaults to 1.0.
+            max_delay (float, optional): Upper bound of a backoff delay in seconds. Defaults to 64.0.
+
+        Raises:
+            ValueError: Raised if {rate} is not positive
+        """
+        if rate <= 0:
+            raise ValueError('argument "rate" should be positive')
+
+        self.__lock = threading.Lock()
+        self.__max_rate = float(rate)
+        self.__rate = float(rate)
+        self.__min_rate = float(min_rate) if min_rate is not None else self.__max_rate / 32
+        self.__burst = float(burst) if burst is not None else max(1.0, self.__max_rate)
+        self.__tokens = self.__burst
+        self.__updated = time.monotonic()
+
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @property
+    def rate(self) -> float:
+        """Current adapted rate in requests per second
+
+        Returns:
+            float: Requests per second
+        """
+        return self.__rate
+
+    @property
+    def max_rate(self) -> float:
+        """Configured maximum rate in requests per second
+
+        Returns:
+            float: Requests per second
+        """
+        return self.__max_rate
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of callers holding a reservation that is not due yet
+
+        Returns:
+            int: Number of waiting callers
+        """
+        with self.__lock:
+            self.__refill()
+            return int(math.ceil(max(0.0, -self.__tokens)))
+
+    def __refill(self):
+        now = time.monotonic()
+        self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated) * self.__rate)
+        self.__updated = now
+
+    def reserve(self) -> float:
+        """Take a token from the bucket without blocking
+
+        Returns:
+            float: Seconds the caller should wait before sending the request
+        """
+        with self.__lock:
+            self.__refill()
+            self.__tokens -= 1
+            if self.__tokens >= 0:
+                return 0.0
+            return -self.__tokens / self.__rate
+
+    def acquire(self):
+        """Block until a request is allowed to be sent
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        """Additively raise the rate after a successful request
+        """
+        with self.__lock:
+            self.__refill()
+            self.__rate = min(self.__max_rate, self.__rate + self.__max_rate / 16)
+
+    def on_throttled(self):
+        """Halve the rate and drop the burst allowance after a throttled request
+        """
+        with self.__lock:
+            self.__refill()
+            self.__rate = max(self.__min_rate, self.__rate / 2)
+            self.__tokens = min(self.__tokens, 0.0)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Jittered exponential backoff delay for a retry
+
+        Args:
+            attempt (int): Zero-based retry number
+
+        Returns:
+            float: Seconds to sleep before the retry
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def is_retryable(error: Exception, idempotent: bool=True) -> bool:
+        """Check whether an error is a quota or transient server error
+
+        Args:
+            error (Exception): Error raised by the request
+            idempotent (bool, optional): Whether sending the request twice is harmless. Defaults to True.
+
+        Returns:
+            bool: True if the request should be retried. Server errors are only retried if {idempotent}.
+        """
+        if not isinstance(error, HttpError) or error.resp.status not in RETRYABLE_STATUS:
+            return False
+        return idempotent or error.resp.status == 429
+
+    @staticmethod
+    def is_idempotent(request) -> bool:
+        """Check whether a request can be resent after a server error
+
+        Args:
+            request (HttpRequest): Request to execute
+
+        Returns:
+            bool: True for GET and PUT (e.g. values.update). False for POST such as values.append and batchUpdate.
+        """
+        return getattr(request, 'method', 'GET').upper() in IDEMPOTENT_METHODS
+
+    def execute(self, request, http=None, on_retry=None, idempotent: bool=None):
+        """Execute a googleapiclient request paced by this limiter
+
+        429 responses are always retried. Server errors are retried only for idempotent
+        requests, since the server may have applied e.g. an append before failing.
+
+        Args:
+            request (HttpRequest): Request to execute
+            http (httplib2.Http, optional): Http object to send the request with. Defaults to None.
+            on_retry (callable, optional): Called with the error before every retry. Defaults to None.
+            idempotent (bool, optional): Retry server errors of the request. Defaults to None and decides by its HTTP method.
+
+        Raises:
+            HttpError: Raised if the request failed with a non-retryable status or retries are exhausted
+
+        Returns:
+            dict: Response data as dict from API
+        """
+        if idempotent is None:
+            idempotent = self.is_idempotent(request)
+
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = request.execute(http=http)
+            except HttpError as e:
+                if not self.is_retryable(e, idempotent=idempotent):
+                    raise
+                self.on_throttled()
+                if attempt >= self.max_retries:
+                    raise
+                if on_retry is not None:
+                    on_retry(e)
+                time.sleep(self.backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            self.on_success()
+            return result
+
+class QuotaScheduler(object):
+    __shared = {}
+    __shared_lock = threading.Lock()
+
+    # Sheets API default quota: 60 read and 60 write requests per minute per user per project.
+    # A service account is one user, so this is the most one credential may send.
+    DEFAULT_READ_RATE = 60 / 60
+    DEFAULT_WRITE_RATE = 60 / 60
+    # Drive API default quota: 12000 requests per minute per project
+    DEFAULT_DRIVE_RATE = 12000 / 60
+
+    def __init__(self, read_rate: float=None, write_rate: float=None, drive_rate: float=None, **kwargs):
+        """Rate limiters for the Sheets read and write quotas and the Drive quota of one project
+
+        Args:
+            read_rate (float, optional): Read requests per second. Defaults to None and uses DEFAULT_READ_RATE.
+            write_rate (float, optional): Write requests per second. Defaults to None and uses DEFAULT_WRITE_RATE.
+            drive_rate (float, optional): Drive API requests per second. Defaults to None and uses DEFAULT_DRIVE_RATE.
+            kwargs: Other arguments passing to RateLimiter
+        """
+        if read_rate is None:
+            read_rate = self.DEFAULT_READ_RATE
+        if write_rate is None:
+            write_rate = self.DEFAULT_WRITE_RATE
+        if drive_rate is None:
+            drive_rate = self.DEFAULT_DRIVE_RATE
+
+        self.read = RateLimiter(read_rate, **kwargs)
+        self.write = RateLimiter(write_rate, **kwargs)
+        self.drive = RateLimiter(drive_rate, **kwargs)
+
+    @classmethod
+    def shared(cls, project_id: str, client_email: str=None):
+        """Process-wide scheduler of an account, created on first use
+
+        Args:
+            project_id (str): Google Cloud project id owning the quota
+            client_email (str, optional): Service account sending the requests, quotas are per user per project. Defaults to None.
+
+        Returns:
+            QuotaScheduler: Scheduler shared by every Sheet of the account
+        """
+        key = (project_id, client_email)
+        with cls.__shared_lock:
+            if key not in cls.__shared:
+                cls.__shared[key] = cls()
+            return cls.__shared[key]
+
+    def limiter_for(self, request) -> RateLimiter:
+        """Choose the quota bucket of a request by its HTTP method
+
+        Args:
+            request (HttpRequest): Request to execute
+
+        Returns:
+            RateLimiter: Read limiter for GET requests. Otherwise, the write limiter.
+        """
+        return self.limiter_for_method(getattr(request, 'method', 'GET'))
+
+    def limiter_for_method(self, method: str) -> RateLimiter:
+        """Choose the quota bucket of a HTTP method
+
+        Args:
+            method (str): HTTP method of the request
+
+        Returns:
+            RateLimiter: Read limiter for GET. Otherwise, the write limiter.
+        """
+        if method.upper() == 'GET':
+            return self.read
+        return self.write
+
+    def execute(self, request, http=None, on_retry=None, idempotent: bool=None):
+        """Execute a Sheets API request through the limiter of its quota bucket
+
+        Args:
+            request (HttpRequest): Request to execute
+            http (httplib2.Http, optional): Http object to send the request with. Defaults to None.
+            on_retry (callable, optional): Called with the error before every retry. Defaults to None.
+            idempotent (bool, optional): Retry server errors of the request. Defaults to None and decides by its HTTP method.
+
+        Returns:
+            dict: Response data as dict from API
+        """
+        return self.limiter_for(request).execute(request, http=http, on_retry=on_retry, idempotent=idempotent)
+
+    def stats(self) -> dict:
+        """Current rate and queue depth of every bucket
+
+        Returns:
+            dict: Stats in {'read': {'rate', 'max_rate', 'queue_depth'}, 'write': {...}, 'drive': {...}} form
+        """
+        return {
+            name: {
+                'rate': limiter.rate,
+                'max_rate': limiter.max_rate,
+                'queue_depth': limiter.queue_depth,
+            }
+            for name, limiter in (('read', self.read), ('write', self.write), ('drive', self.drive))
+        }
@@ -1,20 +1,102 @@
 import os
-
+import re
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import google_auth_httplib2
+import httplib2
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from .cache import ValuesCache
+from .columnar import decode_columns
+from .diff import diff_blocks
+from .grid import iter_grid_rows
+from .metrics import RequestMetrics
+from .ratelimit import QuotaScheduler
 
 __all__ = [
     'Sheet'
 ]
 
+GRID_FIELDS = (
+    'sheets(properties(sheetId,title,gridProperties),'
+    'data(startRow,startColumn,rowData(values(effectiveValue,formattedValue))))'
+)
+
+class _CountingStream(object):
+    """Binary response body counting the bytes read, on_close is called with the count once closed"""
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        self.closed = False
+        self.on_close = None
+
+    def read(self, size: int=-1) -> bytes:
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.raw.close()
+        if self.on_close is not None:
+            self.on_close(self.bytes_read)
+
+class _StreamRequest(object):
+    """Raw GET request whose response body is returned unread, for streaming parsers"""
+    method = 'GET'
+    methodId = 'sheets.spreadsheets.get.stream'
+
+    def __init__(self, uri: str, credentials):
+        self.uri = uri
+        self.credentials = credentials
+        # Called with (status, stream) once the response headers arrived
+        self.on_open = None
+
+    def execute(self, http=None):
+        if not self.credentials.valid:
+            self.credentials.refresh(google_auth_httplib2.Request(httplib2.Http()))
+
+        request = urllib.request.Request(self.uri, headers={
+            'Authorization': 'Bearer {}'.format(self.credentials.token)
+        })
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            resp = httplib2.Response({'status': e.code, 'reason': e.reason})
+            raise HttpError(resp, e.read(), uri=self.uri)
+
+        stream = _CountingStream(response)
+        if self.on_open is not None:
+            self.on_open(response.status, stream)
+        return stream
+
+# Sheets has at most 18278 (ZZZ) columns, longer letter runs are sheet names
+A1_PATTERN = re.compile(r'^(?:(.+)!)?([A-Za-z]{0,3})(\d*)(?::([A-Za-z]{0,3})(\d*))?$')
+QUOTED_SHEET_PATTERN = re.compile(r"^'(?:[^']|'')*'$")
+
 class Sheet(object):
-    def __init__(self, sheet_id: str, credential_path: str=None, scope: list=None):
+    # Number of cells fetched per request when reading a sheet window by window
+    WINDOW_CELLS = 50000
+
+    def __init__(self, sheet_id: str, credential_path: str=None, scope: list=None, scheduler: QuotaScheduler=None, cache: ValuesCache=None,
+                 metrics: RequestMetrics=None, client_options: dict=None):
         """A wrapper class for accessing Google Spreadsheets
 
         Args:
             sheet_id (str): The id of the Google Spreadsheets
             credential_path (str, optional): Google Application Credentials file path. Defaults to None and uses environ GOOGLE_APPLICATION_CREDENTIALS.
             scope (list, optional): Google Spreadsheets auth scope. Defaults to None.
+            scheduler (QuotaScheduler, optional): Rate limiter of API requests. Defaults to None and uses the one shared by the credential's account.
+            cache (ValuesCache, optional): Read-through cache of get_values_by_range. Defaults to None and disables caching.
+            metrics (RequestMetrics, optional): Collector of request metrics. Defaults to None and uses the process-wide one.
+            client_options (dict, optional): Client options of the API services, e.g. {'api_endpoint': url}. Defaults to None.
         """        
         if credential_path is None:
             credential_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', '')
@@ -32,7 +114,18 @@ class Sheet(object):
         )
         
         self.__id = sheet_id
-        self.__service = build('sheets', 'v4', credentials=self.__cred)
+        self.__client_options = client_options
+        self.__service = build('sheets', 'v4', credentials=self.__cred, client_options=client_options)
+
+        if scheduler is None:
+            scheduler = QuotaScheduler.shared(self.__cred.project_id, self.__cred.service_account_email)
+        self.__scheduler = scheduler
+        self.__cache = cache
+        self.__drive = None
+
+        if metrics is None:
+            metrics = RequestMetrics.shared()
+        self.__metrics = metrics
     
     @property
     def service(self):
@@ -52,6 +145,33 @@ class Sheet(object):
         """        
         return self.service.spreadsheets()
 
+    @property
+    def cache(self):
+        """Read-through cache of range values
+
+        Returns:
+            ValuesCache: The ValuesCache object. Returns None if caching is disabled.
+        """
+        return self.__cache
+
+    @property
+    def metrics(self):
+        """Collector of latency, payload, retry and quota metrics of API requests
+
+        Returns:
+            RequestMetrics: The RequestMetrics object
+        """
+        return self.__metrics
+
+    @property
+    def scheduler(self):
+        """Rate limiter every API request of this object passes through
+
+        Returns:
+            QuotaScheduler: The QuotaScheduler object
+        """
+        return self.__scheduler
+
     @staticmethod
     def format_range(sheet_name, range_notation):
         """Construct a A1 notation for Google Spreadsheet
@@ -65,8 +185,130 @@ class Sheet(object):
         """        
         return "'{}'!{}".format(sheet_name, range_notation)
 
+    @staticmethod
+    def column_letter(column: int) -> str:
+        """Convert a 1-based column number to its A1 notation letters
+
+        Args:
+            column (int): Column number starting from 1
+
+        Raises:
+            ValueError: Raised if {column} is less than 1
+
+        Returns:
+            str: Column letters, e.g. 1 -> 'A', 28 -> 'AB'
+        """
+        if column < 1:
+            raise ValueError('argument "column" should be greater than 0')
+
+        letters = ''
+        while column > 0:
+            column, remainder = divmod(column - 1, 26)
+            letters = chr(ord('A') + remainder) + letters
+        return letters
+
+    @staticmethod
+    def column_number(letters: str) -> int:
+        """Convert A1 notation column letters to a 1-based column number
+
+        Args:
+            letters (str): Column letters, e.g. 'AB'
+
+        Returns:
+            int: Column number starting from 1
+        """
+        column = 0
+        for letter in letters.upper():
+            column = column * 26 + ord(letter) - ord('A') + 1
+        return column
+
+    @staticmethod
+    def parse_range(range_notation: str) -> tuple:
+        """Split a A1 notation into its sheet name and corners
+
+        A notation without "!" that is not a cell reference, e.g. "Sheet1", "Jan" or "'My Sheet'",
+        refers to the whole sheet of that name.
+
+        Args:
+            range_notation (str): A1 notation, e.g. "'sheet1'!A1:C10"
+
+        Raises:
+            ValueError: Raised if {range_notation} is not a valid A1 notation
+
+        Returns:
+            tuple: A tuple consists of (sheet_name, start_column, start_row, end_column, end_row), missing parts are None
+        """
+        match = A1_PATTERN.match(range_notation)
+        if match is not None and match.group(1) is None and ':' not in range_notation and not match.group(3):
+            # Letters without a row or a colon, e.g. "Jan", are not a range but a sheet name
+            match = None
+        if match is None:
+            is_quoted = QUOTED_SHEET_PATTERN.match(range_notation) is not None
+            if not range_notation or (not is_quoted and ('!' in range_notation or ':' in range_notation)):
+                raise ValueError('invalid A1 notation "{}"'.format(range_notation))
+            sheet_name = range_notation[1:-1].replace("''", "'") if is_quoted else range_notation
+            return sheet_name, None, None, None, None
+
+        sheet_name, start_column, start_row, end_column, end_row = match.groups()
+        if sheet_name is not None and QUOTED_SHEET_PATTERN.match(sheet_name):
+            sheet_name = sheet_name[1:-1].replace("''", "'")
+
+        return (
+            sheet_name,
+            Sheet.column_number(start_column) if start_column else None,
+            int(start_row) if start_row else None,
+            Sheet.column_number(end_column) if end_column else None,
+            int(end_row) if end_row else None,
+        )
+
+    def _new_http(self):
+        """Create an authorized Http object for requests sent from another thread
+
+        Returns:
+            AuthorizedHttp: The AuthorizedHttp object
+        """
+        return google_auth_httplib2.AuthorizedHttp(self.__cred, http=httplib2.Http())
+
     def _exec_request(self, request, http=None):
-        return request.execute(http=http)
+        with self.__metrics.track(self.__id, request) as record:
+            return self.__scheduler.execute(request, http=http, on_retry=record.retry)
+
+    def _exec_drive_request(self, request):
+        # Drive requests have their own quota, keep them out of the Sheets buckets and metrics
+        return self.__scheduler.drive.execute(request)
+
+    def _current_revision(self) -> str:
+        """Fetch the revision of the spreadsheet from Drive API for cache validation
+
+        Returns:
+            str: Version of the spreadsheet file. Returns None if it cannot be fetched.
+        """
+        if self.__drive is None:
+            self.__drive = build('drive', 'v3', credentials=self.__cred, client_options=self.__client_options)
+
+        request = self.__drive.files().get(
+            fileId=self.__id,
+            fields='version',
+            supportsAllDrives=True
+        )
+        try:
+            results = self._exec_drive_request(request)
+        except HttpError:
+            return None
+        return results.get('version')
+
+    def _invalidate_cache(self):
+        if self.__cache is not None:
+            self.__cache.invalidate(self.__id)
+
+    def _exec_write_request(self, request):
+        """Execute a request modifying the spreadsheet, invalidating cached values around it"""
+        self._invalidate_cache()
+        try:
+            return self._exec_request(request)
+        finally:
+            # A read racing the write may have cached values from before it
+            self._invalidate_cache()
 
     def fetch_sheet_metadata(self, params: dict=None):
         """Returns metadata of the spreadsheets
@@ -82,14 +324,60 @@ class Sheet(object):
                 'includeGridData': False
             }
 
+        kwargs = {
+            key: params[key]
+            for key in ('ranges', 'fields')
+            if params.get(key) is not None
+        }
         request = self.spreadsheets.get(
             spreadsheetId=self.__id,
-            includeGridData=params.get('includeGridData', False)
+            includeGridData=params.get('includeGridData', False),
+            **kwargs
         )
         results = self._exec_request(request)
 
         return results
 
+    def _open_grid_stream(self, params: list):
+        """Send a spreadsheets.get request and return the unread response body
+
+        Args:
+            params (list): A list of (key, value) query parameters
+
+        Returns:
+            file-like: Binary stream of the JSON response
+        """
+        # _baseUrl honours the api_endpoint the service was built with
+        uri = '{}v4/spreadsheets/{}?{}'.format(self.service._baseUrl, self.__id, urlencode(params))
+        return self._exec_request(_StreamRequest(uri, self.__cred))
+
+    def iter_grid_data(self, ranges: list=None, fields: str=None):
+        """Stream grid data of the spreadsheets row by row
+
+        Unlike fetch_sheet_metadata({'includeGridData': True}), the response is parsed while it
+        is downloaded and only one row is kept in memory at a time.
+
+        Args:
+            ranges (list, optional): A1 notations of the ranges to fetch. Defaults to None and fetches every sheet.
+            fields (str, optional): Field mask of the response. Defaults to None and uses GRID_FIELDS.
+
+        Yields:
+            GridRow: Rows in (sheet, row, column, values) form, where values is a list of CellData
+        """
+        if fields is None:
+            fields = GRID_FIELDS
+
+        params = [('includeGridData', 'true'), ('fields', fields)]
+        for _range in ranges or []:
+            params.append(('ranges', _range))
+
+        stream = self._open_grid_stream(params)
+        try:
+            for row in iter_grid_rows(stream):
+                yield row
+        finally:
+            stream.close()
+
     def _spreadsheet_batchUpdate(self, requests: list) -> dict:
         """Wrapper method for sending Spreadsheets batchUpdate request
 
@@ -106,7 +394,28 @@ class Sheet(object):
             spreadsheetId=self.__id,
             body=body
         )
-        results = self._exec_request(http_request)
+        results = self._exec_write_request(http_request)
+        return results
+
+    def _values_batchUpdate(self, data: list, valueInputOption: str='USER_ENTERED') -> dict:
+        """Wrapper method for sending Spreadsheets values batchUpdate request
+
+        Args:
+            data (list): A list of ValueRange dicts consists of range and values
+            valueInputOption (str, optional): Spreadsheets API parameter. Defaults to 'USER_ENTERED'.
+
+        Returns:
+            dict: A dict of the API responses
+        """
+        body = {
+            'valueInputOption': valueInputOption,
+            'data': data
+        }
+        request = self.spreadsheets.values().batchUpdate(
+            spreadsheetId=self.__id,
+            body=body
+        )
+        results = self._exec_write_request(request)
         return results
 
     def create_sheet(self, sheet_name: str) -> dict:
@@ -130,14 +439,14 @@ class Sheet(object):
         ]
         return self._spreadsheet_batchUpdate(requests)
 
-    def get_sheet_id(self, sheet_name: str) -> int:
-        """Get id of the sheet with specific name
+    def get_sheet_properties(self, sheet_name: str) -> dict:
+        """Get properties of the sheet with specific name
 
         Args:
             sheet_name (str): Sheet name to be searched
 
         Returns:
-            int: Sheet id
+            dict: Sheet properties including sheetId and gridProperties
         """
         metadata = self.fetch_sheet_metadata()
         if not metadata:
@@ -145,10 +454,25 @@ class Sheet(object):
 
         for sheet in metadata['sheets']:
             if sheet['properties']['title'] == sheet_name:
-                return sheet['properties']['sheetId']
+                return sheet['properties']
         
         return None
 
+    def get_sheet_id(self, sheet_name: str) -> int:
+        """Get id of the sheet with specific name
+
+        Args:
+            sheet_name (str): Sheet name to be searched
+
+        Returns:
+            int: Sheet id
+        """
+        properties = self.get_sheet_properties(sheet_name)
+        if properties is None:
+            return None
+
+        return properties['sheetId']
+
     def delete_sheet_by_id(self, sheet_id: int) -> dict:
         """Delete sheet with specific id
 
@@ -183,11 +507,13 @@ class Sheet(object):
 
         return self.delete_sheet_by_id(sheet_id)
 
-    def get_values_by_range(self, _range: str) -> list:
+    def get_values_by_range(self, _range: str, valueRenderOption: str=None, dateTimeRenderOption: str=None) -> list:
         """Get values from sheet within range specified
 
         Args:
             _range (str): A1 notation of the range
+            valueRenderOption (str, optional): Spreadsheets API parameter. Defaults to None and uses 'FORMATTED_VALUE'.
+            dateTimeRenderOption (str, optional): Spreadsheets API parameter. Defaults to None and uses 'SERIAL_NUMBER'.
 
         Raises:
             TypeError: if type of {_range} is not str
@@ -198,12 +524,180 @@ class Sheet(object):
         if not isinstance(_range, (str,)):
             raise TypeError('Type of argument "_range" is invalid')
 
+        kwargs = {}
+        if valueRenderOption is not None:
+            kwargs['valueRenderOption'] = valueRenderOption
+        if dateTimeRenderOption is not None:
+            kwargs['dateTimeRenderOption'] = dateTimeRenderOption
+
+        if self.__cache is not None:
+            key = self.__cache.make_key(self.__id, _range, valueRenderOption, dateTimeRenderOption)
+            revision = self._current_revision()
+            values = self.__cache.get(key, revision)
+            if values is not None:
+                return values
+
         resp = self.spreadsheets.values().get(
             spreadsheetId=self.__id,
-            range=_range
+            range=_range,
+            **kwargs
         )
         results = self._exec_request(resp)
-        return results.get('values', [])
+        values = results.get('values', [])
+
+        if self.__cache is not None:
+            self.__cache.put(key, values, revision)
+        return values
+
+    def infer_schema(self, _range: str, header: bool=True) -> dict:
+        """Infer datetime columns from the number format of the first data row
+
+        Unformatted reads return dates as serial numbers, so the cell format is the only
+        way to tell them apart from plain numbers. Only one row of formats is fetched.
+
+        Args:
+            _range (str): A1 notation of the range
+            header (bool, optional): Whether the first row of the range is a header. Defaults to True.
+
+        Returns:
+            dict: dtype of datetime columns keyed by column position
+        """
+        sheet_name, start_column, start_row, end_column, _ = self.parse_range(_range)
+        row = (start_row or 1) + (1 if header else 0)
+        if start_column is None:
+            row_range = '{0}:{0}'.format(row)
+        else:
+            row_range = '{}{}:{}{}'.format(
+                self.column_letter(start_column), row,
+                self.column_letter(end_column or start_column), row
+            )
+        if sheet_name is not None:
+            row_range = self.format_range(sheet_name, row_range)
+
+        metadata = self.fetch_sheet_metadata({
+            'includeGridData': True,
+            'ranges': [row_range],
+            'fields': 'sheets/data/rowData/values/effectiveFormat/numberFormat/type',
+        })
+
+        schema = {}
+        for sheet in metadata.get('sheets', []):
+            for data in sheet.get('data', []):
+                for row_data in data.get('rowData', [])[:1]:
+                    for j, cell in enumerate(row_data.get('values', [])):
+                        number_format = cell.get('effectiveFormat', {}).get('numberFormat', {})
+                        if number_format.get('type') in ('DATE', 'DATE_TIME'):
+                            schema[j] = 'datetime'
+        return schema
+
+    def get_columns_by_range(self, _range: str, header: bool=True, schema: dict=None, infer_schema: bool=True) -> dict:
+        """Get values within range as typed columns
+
+        Values are read unformatted with dates as serial numbers, ragged rows are padded and
+        every column is converted into a NumPy masked array whose mask marks empty cells.
+
+        Args:
+            _range (str): A1 notation of the range
+            header (bool, optional): Use the first row as column names. Defaults to True.
+            schema (dict, optional): dtype of columns keyed by column name or position, one of 'bool', 'int', 'float', 'datetime' and 'str'. Defaults to None.
+            infer_schema (bool, optional): Detect datetime columns from cell formats. Defaults to True.
+
+        Raises:
+            ValueError: Raised if {infer_schema} is True and {_range} is not a valid A1 notation
+
+        Returns:
+            dict: numpy.ma.MaskedArray keyed by column name
+        """
+        if infer_schema:
+            # Fail before fetching values rather than after
+            self.parse_range(_range)
+
+        rows = self.get_values_by_range(
+            _range,
+            valueRenderOption='UNFORMATTED_VALUE',
+            dateTimeRenderOption='SERIAL_NUMBER'
+        )
+
+        merged_schema = {}
+        if infer_schema and rows:
+            merged_schema.update(self.infer_schema(_range, header=header))
+        if schema is not None:
+            merged_schema.update(schema)
+
+        return decode_columns(rows, header=header, schema=merged_schema)
+
+    def iter_rows(self, sheet_name: str, window_rows: int=None, prefetch: bool=True):
+        """Read a sheet row by row, fetching a window of rows per request
+
+        Windows are sized from the gridProperties of the sheet so that each request reads
+        about WINDOW_CELLS cells. Reading stops at the first fully empty window.
+
+        Args:
+            sheet_name (str): Name of the sheet
+            window_rows (int, optional): Number of rows per request. Defaults to None and sizes from the sheet grid.
+            prefetch (bool, optional): Fetch the next window in background while the current one is consumed. Defaults to True.
+
+        Raises:
+            ValueError: Raised if the sheet does not exist
+
+        Yields:
+            list: Values of a row. Empty rows between non-empty ones are yielded as empty lists.
+        """
+        properties = self.get_sheet_properties(sheet_name)
+        if properties is None:
+            raise ValueError('sheet "{}" not found'.format(sheet_name))
+
+        grid = properties.get('gridProperties', {})
+        row_count = grid.get('rowCount', 0)
+        column_count = max(1, grid.get('columnCount', 1))
+        if window_rows is None:
+            window_rows = max(1, min(row_count, self.WINDOW_CELLS // column_count))
+
+        last_column = self.column_letter(column_count)
+        starts = list(range(1, row_count + 1, window_rows))
+        if not starts:
+            return
+
+        def fetch(start, http=None):
+            _range = self.format_range(
+                sheet_name,
+                'A{}:{}{}'.format(start, last_column, min(row_count, start + window_rows - 1))
+            )
+            request = self.spreadsheets.values().get(
+                spreadsheetId=self.__id,
+                range=_range
+            )
+            return self._exec_request(request, http=http).get('values', [])
+
+        if prefetch:
+            executor = ThreadPoolExecutor(max_workers=1)
+            http = self._new_http()
+            schedule = lambda start: executor.submit(fetch, start, http)
+        else:
+            executor = None
+            def schedule(start):
+                future = Future()
+                future.set_result(fetch(start))
+                return future
+
+        try:
+            future = schedule(starts[0])
+            skipped = 0
+            for index, start in enumerate(starts):
+                values = future.result()
+                if not any(values):
+                    return
+                if index + 1 < len(starts):
+                    future = schedule(starts[index + 1])
+
+                for _ in range(skipped):
+                    yield []
+                for row in values:
+                    yield row
+                skipped = window_rows - len(values)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
 
     def update_values_by_range(self, _range: str, values: list, valueInputOption: str='USER_ENTERED') -> int:
         """Update values within specific range
@@ -225,9 +719,69 @@ class Sheet(object):
             valueInputOption=valueInputOption,
             body=body
         )
-        results = self._exec_request(request)
+        results = self._exec_write_request(request)
         return results.get('updatedCells')
 
+    def sync_values(self, sheet_name: str, values: list, origin: str='A1', current: list=None, valueInputOption: str='USER_ENTERED') -> dict:
+        """Make a sheet contain {values} by writing only the cells that differ
+
+        Changed cells are grouped into rectangular blocks and written in a single values
+        batchUpdate request. Rows no longer in {values} are cleared. Cells to the right of
+        the widest row of {values} are left untouched.
+
+        Args:
+            sheet_name (str): Name of the sheet
+            values (list): A list of rows the sheet should contain
+            origin (str, optional): A1 notation of the top-left cell of the grid. Defaults to 'A1'.
+            current (list, optional): A cached copy of the rows currently in the sheet, read with UNFORMATTED_VALUE. Defaults to None and fetches them.
+            valueInputOption (str, optional): Spreadsheets API parameter. Defaults to 'USER_ENTERED'.
+
+        Returns:
+            dict: Summary in {'updatedBlocks', 'updatedCells', 'appendedRows', 'removedRows'} form
+        """
+        _, column, row, _, _ = self.parse_range(origin)
+        column = column or 1
+        row = row or 1
+        width = max([len(r) for r in values] + [1])
+
+        if current is None:
+            # Unformatted values compare equal to raw targets whatever the number format of the cell
+            current = self.get_values_by_range(
+                self.format_range(
+                    sheet_name,
+                    '{}{}:{}'.format(
+                        self.column_letter(column), row,
+                        self.column_letter(column + width - 1)
+                    )
+                ),
+                valueRenderOption='UNFORMATTED_VALUE',
+                dateTimeRenderOption='FORMATTED_STRING'
+            )
+
+        blocks = diff_blocks(current, values)
+        summary = {
+            'updatedBlocks': len(blocks),
+            'updatedCells': 0,
+            'appendedRows': max(0, len(values) - len(current)),
+            'removedRows': sum(1 for r in current[len(values):] if any(c not in (None, '') for c in r)),
+        }
+        if not blocks:
+            return summary
+
+        data = [
+            {
+                'range': self.format_range(
+                    sheet_name,
+                    '{}{}'.format(self.column_letter(column + block['column']), row + block['row'])
+                ),
+                'values': block['values']
+            }
+            for block in blocks
+        ]
+        results = self._values_batchUpdate(data, valueInputOption=valueInputOption)
+        summary['updatedCells'] = results.get('totalUpdatedCells', 0)
+        return summary
+
     def append_values(self, _range: str, values: list, valueInputOption: str='USER_ENTERED'):
         """Append new rows with range column specified
 
@@ -248,5 +802,5 @@ class Sheet(object):
             valueInputOption=valueInputOption,
             body=body
         )
-        results = self._exec_request(request)
+        results = self._exec_write_request(request)
         return results.get('updates')
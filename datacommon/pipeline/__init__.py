@@ -0,0 +1,11 @@
+from .transfer import *
+from .parallel import *
+
+__all__ = [
+    'to_sheet_value',
+    'to_sheet_rows',
+    'QueryToSheetTransfer',
+    'ParallelTransform',
+    'chunked',
+    'columns_to_sheet_rows',
+]
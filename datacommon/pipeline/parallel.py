@@ -0,0 +1,261 @@
+import os
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8, columnar chunks are pickled instead
+    shared_memory = None
+
+from .transfer import to_sheet_rows
+
+__all__ = [
+    'chunked',
+    'columns_to_sheet_rows',
+    'ParallelTransform',
+]
+
+ALIGNMENT = 64
+
+def chunked(iterable, size: int):
+    """Group items of an iterable into lists, e.g. rows of Sheet.iter_rows
+
+    Args:
+        iterable (iterable): Items to group
+        size (int): Number of items per chunk
+
+    Yields:
+        list: A chunk of items
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _to_sheet_array(column) -> np.ndarray:
+    """Vectorized conversion of a typed column into sheet values"""
+    mask = np.ma.getmaskarray(column)
+    data = np.ma.getdata(column)
+    if np.issubdtype(data.dtype, np.datetime64):
+        values = np.char.replace(np.datetime_as_string(data, unit='s'), 'T', ' ').astype(object)
+    elif data.dtype.kind in 'iub':
+        values = data.astype(object)
+    elif data.dtype.kind == 'f':
+        values = data.astype(object)
+        mask = mask | ~np.isfinite(data)
+    else:
+        values = data.astype(object)
+        mask = mask | np.equal(values, None)
+    values[mask] = ''
+    return values
+
+def columns_to_sheet_rows(columns: dict) -> list:
+    """Convert typed columns into rows of sheet values
+
+    Args:
+        columns (dict): Equal-length numpy arrays or masked arrays keyed by column name
+
+    Returns:
+        list: A list of rows of values, masked cells and NaN are empty strings
+    """
+    if not columns:
+        return []
+    converted = [_to_sheet_array(column) for column in columns.values()]
+    return np.stack(converted, axis=1).tolist()
+
+class _SharedChunk(object):
+    """Pickled description of columns placed in a shared memory block"""
+    def __init__(self, name: str, layout: list):
+        self.name = name
+        self.layout = layout
+
+    def attach(self, buf) -> dict:
+        columns = {}
+        for key, dtype, shape, offset, mask_offset in self.layout:
+            count = int(np.prod(shape))
+            data = np.frombuffer(buf, dtype=dtype, count=count, offset=offset).reshape(shape)
+            data.flags.writeable = False
+            if mask_offset is None:
+                columns[key] = data
+            else:
+                mask = np.frombuffer(buf, dtype=np.bool_, count=count, offset=mask_offset).reshape(shape)
+                mask.flags.writeable = False
+                columns[key] = np.ma.MaskedArray(data, mask=mask, copy=False)
+        return columns
+
+def _share_columns(columns: dict):
+    """Copy numeric columns into one shared memory block
+
+    Returns:
+        tuple: A tuple consists of (SharedMemory, _SharedChunk). Returns (None, None) if a column cannot be shared.
+    """
+    layout = []
+    size = 0
+    for key, column in columns.items():
+        data = np.ma.getdata(column)
+        if not isinstance(column, np.ndarray) or data.dtype.hasobject:
+            return None, None
+        offset = size
+        size += -(-data.nbytes // ALIGNMENT) * ALIGNMENT
+        mask_offset = None
+        if isinstance(column, np.ma.MaskedArray):
+            mask_offset = size
+            size += -(-data.size // ALIGNMENT) * ALIGNMENT
+        layout.append((key, data.dtype.str, data.shape, offset, mask_offset))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for (key, dtype, shape, offset, mask_offset), column in zip(layout, columns.values()):
+        count = int(np.prod(shape))
+        target = np.frombuffer(shm.buf, dtype=dtype, count=count, offset=offset).reshape(shape)
+        target[...] = np.ma.getdata(column)
+        if mask_offset is not None:
+            target_mask = np.frombuffer(shm.buf, dtype=np.bool_, count=count, offset=mask_offset).reshape(shape)
+            target_mask[...] = np.ma.getmaskarray(column)
+        del target
+        if mask_offset is not None:
+            del target_mask
+    return shm, _SharedChunk(shm.name, layout)
+
+def _run(func, chunk):
+    if not isinstance(chunk, _SharedChunk):
+        return func(chunk)
+
+    shm = shared_memory.SharedMemory(name=chunk.name)
+    columns = chunk.attach(shm.buf)
+    result = func(columns)
+    del columns
+    try:
+        shm.close()
+    except BufferError:
+        # The result still points into the block, detach it before closing
+        result = pickle.loads(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        shm.close()
+    return result
+
+class ParallelTransform(object):
+    def __init__(self, func=to_sheet_rows, workers: int=None, max_pending: int=None,
+                 shared_memory_min_bytes: int=1 << 16):
+        """Apply a function to chunks on a process pool, returning results in order
+
+        Chunks are usually lists of rows and are pickled to the workers. A chunk given as a dict
+        of numeric numpy arrays (e.g. from decode_columns) whose size reaches
+        {shared_memory_min_bytes} is copied into a shared memory block instead, and the worker
+        receives read-only views of it. At most {max_pending} chunks are in flight, so a slow
+        consumer holds back the source.
+
+        Args:
+            func (callable, optional): Picklable function converting a chunk. Defaults to to_sheet_rows.
+            workers (int, optional): Number of worker processes. Defaults to None and uses the CPU count.
+            max_pending (int, optional): Maximum number of chunks in flight. Defaults to None and uses 2 * workers.
+            shared_memory_min_bytes (int, optional): Smallest columnar chunk sent through shared memory. Defaults to 65536.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if max_pending is None:
+            max_pending = 2 * workers
+
+        self.func = func
+        self.workers = workers
+        self.max_pending = max(1, max_pending)
+        self.shared_memory_min_bytes = shared_memory_min_bytes
+        self.__executor = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.__executor
+
+    def _submit(self, chunk) -> tuple:
+        shm = None
+        if shared_memory is not None and isinstance(chunk, dict) and chunk:
+            nbytes = sum(np.ma.getdata(c).nbytes for c in chunk.values() if isinstance(c, np.ndarray))
+            if nbytes >= self.shared_memory_min_bytes:
+                shm, shared = _share_columns(chunk)
+                if shared is not None:
+                    chunk = shared
+        return self._executor().submit(_run, self.func, chunk), shm
+
+    @staticmethod
+    def _release(shm):
+        if shm is not None:
+            try:
+                shm.close()
+            finally:
+                shm.unlink()
+
+    def imap(self, chunks):
+        """Transform chunks lazily
+
+        Args:
+            chunks (iterable): Chunks of rows or dicts of columns
+
+        Yields:
+            Result of func for every chunk, in the order of {chunks}
+        """
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(self._submit(chunk))
+                if len(pending) >= self.max_pending:
+                    future, shm = pending.popleft()
+                    try:
+                        result = future.result()
+                    finally:
+                        self._release(shm)
+                    yield result
+
+            while pending:
+                future, shm = pending.popleft()
+                try:
+                    result = future.result()
+                finally:
+                    self._release(shm)
+                yield result
+        finally:
+            # Cancel every chunk not started yet first, then wait for running ones
+            # since they still read their block
+            cancelled = [future.cancel() for future, _ in pending]
+            for (future, shm), is_cancelled in zip(pending, cancelled):
+                try:
+                    if not is_cancelled:
+                        future.exception()
+                except Exception:
+                    pass
+                finally:
+                    try:
+                        self._release(shm)
+                    except Exception:
+                        pass
+            pending.clear()
+
+    def map(self, chunks) -> list:
+        """Transform all chunks
+
+        Args:
+            chunks (iterable): Chunks of rows or dicts of columns
+
+        Returns:
+            list: Results of func, in the order of {chunks}
+        """
+        return list(self.imap(chunks))
+
+    def close(self):
+        """Shut down the worker processes
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
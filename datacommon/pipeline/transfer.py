@@ -0,0 +1,365 @@
+import argparse
+import datetime
+import decimal
+import functools
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+
+__all__ = [
+    'to_sheet_value',
+    'to_sheet_rows',
+    'QueryToSheetTransfer',
+]
+
+def _format_timedelta(value: datetime.timedelta) -> str:
+    """Format a MySQL TIME value, returned by pymysql as timedelta, in [-]H:MM:SS form"""
+    sign = '-' if value < datetime.timedelta(0) else ''
+    value = abs(value)
+    minutes, seconds = divmod(value.days * 86400 + value.seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    text = '{}{}:{:02d}:{:02d}'.format(sign, hours, minutes, seconds)
+    if value.microseconds:
+        text += '.{:06d}'.format(value.microseconds)
+    return text
+
+def to_sheet_value(value, escape_text: bool=True):
+    """Convert a value from database into a value accepted by Spreadsheets API
+
+    Args:
+        value: A column value of a query result
+        escape_text (bool, optional): Prefix text with "'" so that USER_ENTERED input keeps it as is, e.g. '00123' or '=1+1'. Defaults to True.
+
+    Returns:
+        Value which can be serialized into JSON and parsed by USER_ENTERED input
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        return '' if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, int):
+        return value
+    if isinstance(value, decimal.Decimal):
+        # str keeps every digit, which a float would round
+        return str(value) if value.is_finite() else ''
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return _format_timedelta(value)
+
+    if isinstance(value, (bytes, bytearray)):
+        text = value.decode('utf-8', 'replace')
+    else:
+        text = str(value)
+    if escape_text and text:
+        return "'" + text
+    return text
+
+def to_sheet_rows(rows: list, escape_text: bool=True) -> list:
+    """Convert rows of a query result into rows of sheet values
+
+    Args:
+        rows (list): A list of tuples, or of dicts if queried with dict cursor
+        escape_text (bool, optional): Prefix text with "'" for USER_ENTERED input. Defaults to True.
+
+    Returns:
+        list: A list of rows of values
+    """
+    return [
+        [to_sheet_value(v, escape_text) for v in (row.values() if isinstance(row, dict) else row)]
+        for row in rows
+    ]
+
+class _Failure(object):
+    def __init__(self, error):
+        self.error = error
+
+_DONE = object()
+
+class QueryToSheetTransfer(object):
+    def __init__(self, query, sheet, sheet_name: str, chunk_size: int=1000, queue_size: int=4,
+                 start_row: int=1, include_header: bool=True, checkpoint_path: str=None,
+                 valueInputOption: str='USER_ENTERED', transform=None):
+        """Stream a query result from database into a sheet
+
+        Rows are fetched in chunks on a background thread and converted into sheet values while
+        the previous chunk is uploaded. At most {queue_size} chunks wait for upload, so a slow
+        sheet holds back the database side. After every uploaded chunk the row offset is saved
+        to {checkpoint_path}, and a later run with the same checkpoint skips the uploaded rows.
+
+        A resumed run executes the query again and drops the first rows up to the offset, so the
+        query must return rows in the same order every time, i.e. have an ORDER BY on a unique key.
+        Otherwise rows can be skipped or uploaded twice.
+
+        Text values are prefixed with "'" under USER_ENTERED input so that the sheet keeps them
+        as text. A custom {transform} should convert chunks with to_sheet_rows(rows, escape_text)
+        matching {valueInputOption}.
+
+        Args:
+            query (MySQLQuery): Query object providing iter_query
+            sheet (Sheet): Destination spreadsheets
+            sheet_name (str): Name of the destination sheet
+            chunk_size (int, optional): Number of rows per fetch and upload. Defaults to 1000.
+            queue_size (int, optional): Maximum number of chunks waiting for upload. Defaults to 4.
+            start_row (int, optional): Row number to write the first row to. Defaults to 1.
+            include_header (bool, optional): Write column names before the rows. Defaults to True.
+            checkpoint_path (str, optional): JSON file path of the resumable checkpoint, requires a deterministic ORDER BY. Defaults to None.
+            valueInputOption (str, optional): Spreadsheets API parameter. Defaults to 'USER_ENTERED'.
+            transform (ParallelTransform, optional): Process pool converting chunks into sheet values. Defaults to None and converts on the fetching thread.
+
+        Raises:
+            ValueError: Raised if {chunk_size} or {queue_size} is not positive
+        """
+        if chunk_size < 1 or queue_size < 1:
+            raise ValueError('arguments "chunk_size" and "queue_size" should be positive')
+
+        self.query = query
+        self.sheet = sheet
+        self.sheet_name = sheet_name
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.start_row = start_row
+        self.include_header = include_header
+        self.checkpoint_path = checkpoint_path
+        self.valueInputOption = valueInputOption
+        self.transform = transform
+
+    def load_checkpoint(self) -> int:
+        """Number of rows uploaded by a previous unfinished run
+
+        Returns:
+            int: Row offset to resume from
+        """
+        if self.checkpoint_path is None or not os.path.exists(self.checkpoint_path):
+            return 0
+
+        with open(self.checkpoint_path, 'r') as f:
+            return json.load(f).get('rows', 0)
+
+    def save_checkpoint(self, rows: int):
+        """Record the number of uploaded rows
+
+        Args:
+            rows (int): Row offset to resume from
+        """
+        if self.checkpoint_path is None:
+            return
+
+        tmp_path = '{}.tmp'.format(self.checkpoint_path)
+        with open(tmp_path, 'w') as f:
+            json.dump({'rows': rows}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        """Remove the checkpoint after the transfer completed
+        """
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _produce(self, sql, args, skip, chunks, stop, stats):
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch(source):
+            remaining = skip
+            started = time.monotonic()
+            for rows in source:
+                if remaining >= len(rows):
+                    remaining -= len(rows)
+                    continue
+                rows = rows[remaining:]
+                remaining = 0
+                stats['fetch_seconds'] += time.monotonic() - started
+                yield rows
+                started = time.monotonic()
+
+        source = self.query.iter_query(sql, args=args, chunk_size=self.chunk_size)
+        try:
+            if self.transform is not None:
+                converted = self.transform.imap(fetch(source))
+            else:
+                escape_text = (self.valueInputOption == 'USER_ENTERED')
+                converted = map(functools.partial(to_sheet_rows, escape_text=escape_text), fetch(source))
+            for values in converted:
+                if not put(values):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(_Failure(e))
+        finally:
+            # Close the source here rather than on garbage collection, so a stopped
+            # transfer aborts the query at once instead of streaming the remaining rows
+            source.close()
+
+    def _header(self) -> list:
+        description = getattr(self.query, 'description', None) or []
+        return [column[0] for column in description]
+
+    def _ensure_grid(self, grid: dict, last_row: int, width: int):
+        """Append rows and columns to the sheet if the next upload exceeds its grid"""
+        requests = []
+        if last_row > grid['rowCount']:
+            length = max(last_row - grid['rowCount'], self.chunk_size * self.queue_size)
+            requests.append({'appendDimension': {'sheetId': grid['sheetId'], 'dimension': 'ROWS', 'length': length}})
+            grid['rowCount'] += length
+        if width > grid['columnCount']:
+            length = width - grid['columnCount']
+            requests.append({'appendDimension': {'sheetId': grid['sheetId'], 'dimension': 'COLUMNS', 'length': length}})
+            grid['columnCount'] += length
+        if requests:
+            self.sheet._spreadsheet_batchUpdate(requests)
+
+    def run(self, sql: str, args: tuple=None) -> dict:
+        """Run the query and upload its result
+
+        Args:
+            sql (str): SQL query string
+            args (tuple, optional): Query parameters to escape. Defaults to None.
+
+        Raises:
+            ValueError: Raised if the destination sheet does not exist
+
+        Returns:
+            dict: Throughput report
+        """
+        properties = self.sheet.get_sheet_properties(self.sheet_name)
+        if properties is None:
+            raise ValueError('sheet "{}" not found'.format(self.sheet_name))
+        grid = {
+            'sheetId': properties['sheetId'],
+            'rowCount': properties.get('gridProperties', {}).get('rowCount', 0),
+            'columnCount': properties.get('gridProperties', {}).get('columnCount', 0),
+        }
+
+        resumed = offset = self.load_checkpoint()
+        header_rows = 1 if self.include_header else 0
+        stats = {'fetch_seconds': 0.0}
+        report = {
+            'rows': 0,
+            'chunks': 0,
+            'resumed_from': resumed,
+            'upload_seconds': 0.0,
+            'wait_seconds': 0.0,
+        }
+
+        chunks = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce,
+            args=(sql, args, resumed, chunks, stop, stats),
+            daemon=True
+        )
+        started = time.monotonic()
+        producer.start()
+        try:
+            while True:
+                waited = time.monotonic()
+                item = chunks.get()
+                report['wait_seconds'] += time.monotonic() - waited
+                if item is _DONE:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+
+                if offset == 0 and self.include_header:
+                    item = [self._header()] + item
+                    row = self.start_row
+                else:
+                    row = self.start_row + header_rows + offset
+
+                uploading = time.monotonic()
+                self._ensure_grid(grid, row + len(item) - 1, max(len(r) for r in item))
+                self.sheet.update_values_by_range(
+                    self.sheet.format_range(self.sheet_name, 'A{}'.format(row)),
+                    item,
+                    valueInputOption=self.valueInputOption
+                )
+                report['upload_seconds'] += time.monotonic() - uploading
+
+                written = len(item) - (header_rows if offset == 0 else 0)
+                offset += written
+                report['rows'] += written
+                report['chunks'] += 1
+                self.save_checkpoint(offset)
+        finally:
+            stop.set()
+            producer.join()
+
+        if report['chunks'] == 0 and resumed == 0 and self.include_header:
+            self._ensure_grid(grid, self.start_row, len(self._header()))
+            self.sheet.update_values_by_range(
+                self.sheet.format_range(self.sheet_name, 'A{}'.format(self.start_row)),
+                [self._header()],
+                valueInputOption=self.valueInputOption
+            )
+
+        self.clear_checkpoint()
+        report['fetch_seconds'] = stats['fetch_seconds']
+        report['seconds'] = time.monotonic() - started
+        report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] > 0 else 0.0
+        return report
+
+def main(argv: list=None) -> int:
+    """Console entry point running a MySQL query and pushing the result to a sheet
+
+    Args:
+        argv (list, optional): Command line arguments. Defaults to None and uses sys.argv.
+
+    Returns:
+        int: Exit status
+    """
+    from ..db import MySQLQuery
+    from ..google_app import Sheet
+
+    parser = argparse.ArgumentParser(description='Transfer a MySQL query result to Google Sheets')
+    parser.add_argument('--host', required=True, help='host environment name defined in db.yml')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--sql', help='SQL query string')
+    source.add_argument('--sql-file', help='file containing the SQL query')
+    parser.add_argument('--spreadsheet-id', required=True, help='id of the Google Spreadsheets')
+    parser.add_argument('--sheet-name', required=True, help='name of the destination sheet')
+    parser.add_argument('--credential-path', default=None, help='Google Application Credentials file path')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='rows per fetch and upload')
+    parser.add_argument('--queue-size', type=int, default=4, help='chunks waiting for upload')
+    parser.add_argument('--start-row', type=int, default=1, help='row number of the first written row')
+    parser.add_argument('--no-header', action='store_true', help='do not write column names')
+    parser.add_argument('--checkpoint', default=None, help='JSON file path of the resumable checkpoint, '
+                        'the query must have an ORDER BY on a unique key for resuming to skip the right rows')
+    options = parser.parse_args(argv)
+
+    sql = options.sql
+    if options.sql_file is not None:
+        with open(options.sql_file, 'r') as f:
+            sql = f.read()
+
+    transfer = QueryToSheetTransfer(
+        MySQLQuery(options.host),
+        Sheet(options.spreadsheet_id, credential_path=options.credential_path),
+        options.sheet_name,
+        chunk_size=options.chunk_size,
+        queue_size=options.queue_size,
+        start_row=options.start_row,
+        include_header=not options.no_header,
+        checkpoint_path=options.checkpoint
+    )
+    report = transfer.run(sql)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,12 +20,17 @@ setuptools.setup(
     description="Common packages for easily setting up utilities",
     long_description=long_description,
     url="https://github.com/j4nusl1n/common-util.git",
-    packages=setuptools.find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
+    packages=setuptools.find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests", "benchmarks", "benchmarks.*"]),
     classifiers=[
         "Programming Language :: Python :: 3",
     ],
     exclude_package_data={
         "": ["test_*.py"]
     },
-    install_requires=requirements
+    install_requires=requirements,
+    entry_points={
+        "console_scripts": [
+            "datacommon-mysql-to-sheet=datacommon.pipeline.transfer:main",
+        ]
+    }
 )
\ No newline at end of file
@@ -6,6 +6,46 @@ import pytest
 
 from ..datacommon import db
 
+class FakeStreamCursor(object):
+    description = (('id', 3, None, 11, 11, 0, False),)
+
+    def __init__(self, connection, rows):
+        self.connection = connection
+        self.rows = rows
+        self.read = 0
+
+    def execute(self, sql, args):
+        pass
+
+    def fetchmany(self, size):
+        chunk = [(i,) for i in range(self.read, min(self.read + size, self.rows))]
+        self.read += len(chunk)
+        return chunk
+
+    def close(self):
+        # Like SSCursor, closing reads the rest of the unbuffered result
+        self.read = self.rows
+
+class FakeStreamConnection(object):
+    def __init__(self, rows):
+        self.open = True
+        self.rows = rows
+        self.cursors = []
+
+    def cursor(self, cursorclass):
+        self.cursors.append(FakeStreamCursor(self, self.rows))
+        return self.cursors[-1]
+
+    def close(self):
+        self.open = False
+
+class FakeConnect(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def close(self):
+        pass
+
 class Test_MySQL(unittest.TestCase):
     def setUp(self):
         pass
@@ -40,5 +80,27 @@ class Test_MySQL(unittest.TestCase):
         query = db.factory_query('MySQL', 'development')
         self.assertIsInstance(query, (db.MySQLQuery,))
 
+class Test_MySQLStream(unittest.TestCase):
+    def setUp(self):
+        self.connection = FakeStreamConnection(rows=10 ** 6)
+        self.query = db.MySQLQuery.__new__(db.MySQLQuery)
+        self.query.dict_cursor = False
+        self.query.description = None
+        self.query.db_connect = FakeConnect(self.connection)
+
+    def test_iter_query(self):
+        self.connection.rows = 25
+        chunks = list(self.query.iter_query('SELECT 1', chunk_size=10))
+        self.assertListEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        self.assertEqual(self.query.description[0][0], 'id')
+        self.assertTrue(self.connection.open)
+
+    def test_abort_unfinished_stream(self):
+        stream = self.query.iter_query('SELECT 1', chunk_size=10)
+        next(stream)
+        stream.close()
+        self.assertFalse(self.connection.open)
+        self.assertEqual(self.connection.cursors[0].read, 10)
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
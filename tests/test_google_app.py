@@ -1,11 +1,19 @@
+import io
 import os
 import json
+import time
+import asyncio
+import tempfile
 import unittest
 
+import numpy as np
 import pytest
-from googleapiclient.http import HttpMock
+from aiohttp import web
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMock, HttpMockSequence, HttpRequest
 
 from ..datacommon.google_app import *
+from ..benchmarks.fake_sheets import FakeSheetsServer, write_credentials
 
 class MockSheet(Sheet):
     @property
@@ -16,7 +24,10 @@ class MockSheet(Sheet):
     def mock_response(self, mock_resp):
         self.__mock_resp = mock_resp
 
-    def _exec_request(self, request):
+    def _exec_request(self, request, http=None):
+        return request.execute(http=self.__mock_resp)
+
+    def _exec_drive_request(self, request):
         return request.execute(http=self.__mock_resp)
 
 class Test_Sheet(unittest.TestCase):
@@ -123,5 +134,633 @@ class Test_Sheet(unittest.TestCase):
 
         self.assertListEqual(expect['values'], self.sh.get_values_by_range('A1:C1'))
 
+    def test_column_letter(self):
+        self.assertEqual(self.sh.column_letter(1), 'A')
+        self.assertEqual(self.sh.column_letter(26), 'Z')
+        self.assertEqual(self.sh.column_letter(28), 'AB')
+        self.assertEqual(self.sh.column_letter(703), 'AAA')
+
+    def test_iter_rows(self):
+        metadata = {
+            'sheets': [
+                {
+                    'properties': {
+                        'sheetId': 0,
+                        'title': 'sheet1',
+                        'gridProperties': {'rowCount': 16, 'columnCount': 2}
+                    }
+                }
+            ]
+        }
+        for prefetch in (True, False):
+            self.sh.mock_response = HttpMockSequence([
+                ({'status': '200'}, json.dumps(metadata)),
+                ({'status': '200'}, json.dumps({'values': [['a', 1], ['b', 2], ['c']]})),
+                ({'status': '200'}, json.dumps({'values': [['d', 4]]})),
+                ({'status': '200'}, json.dumps({})),
+                ({'status': '200'}, json.dumps({'values': [['unread']]})),
+            ])
+            rows = list(self.sh.iter_rows('sheet1', window_rows=4, prefetch=prefetch))
+            self.assertListEqual(rows, [['a', 1], ['b', 2], ['c'], [], ['d', 4]])
+            # No window is fetched after the first empty one
+            self.assertEqual(len(self.sh.mock_response._iterable), 1)
+
+        self.sh.mock_response = HttpMockSequence([({'status': '200'}, json.dumps(metadata))])
+        with self.assertRaises(ValueError):
+            list(self.sh.iter_rows('sheet2'))
+
+class Test_Columnar(unittest.TestCase):
+    def setUp(self):
+        self.sh = MockSheet('')
+
+    def test_parse_range(self):
+        self.assertTupleEqual(self.sh.parse_range("'it''s'!B2:AB10"), ("it's", 2, 2, 28, 10))
+        self.assertTupleEqual(self.sh.parse_range('A:C'), (None, 1, None, 3, None))
+        self.assertTupleEqual(self.sh.parse_range('Sheet1'), ('Sheet1', None, None, None, None))
+        self.assertTupleEqual(self.sh.parse_range('My Sheet'), ('My Sheet', None, None, None, None))
+        self.assertTupleEqual(self.sh.parse_range('Jan'), ('Jan', None, None, None, None))
+        self.assertTupleEqual(self.sh.parse_range("'it''s'"), ("it's", None, None, None, None))
+        with self.assertRaises(ValueError):
+            self.sh.parse_range('A1:B2:C3')
+
+    def test_decode_columns(self):
+        rows = [
+            ['name', 'count', 'price', 'date', 'flag'],
+            ['a', 1, 1.5, 43831, True],
+            ['b', '', 2],
+            [],
+            ['c', 3, 'n/a', 43832.5, False],
+        ]
+        columns = decode_columns(rows, schema={'date': 'datetime'})
+        self.assertListEqual(list(columns), ['name', 'count', 'price', 'date', 'flag'])
+        self.assertEqual(columns['name'].dtype, object)
+        self.assertListEqual(columns['name'].mask.tolist(), [False, False, True, False])
+        self.assertEqual(columns['count'].dtype, np.int64)
+        self.assertListEqual(columns['count'].tolist(), [1, None, None, 3])
+        self.assertEqual(columns['price'].dtype, object)
+        self.assertEqual(columns['date'].dtype, np.dtype('datetime64[ms]'))
+        self.assertEqual(columns['date'][0], np.datetime64('2020-01-01T00:00'))
+        self.assertEqual(columns['date'][3], np.datetime64('2020-01-02T12:00'))
+        self.assertEqual(columns['flag'].dtype, np.bool_)
+
+    def test_decode_columns_invalid_cells(self):
+        columns = decode_columns([[1.5], ['x'], [2]], header=False, schema={0: 'float'})
+        self.assertListEqual(columns[0].tolist(), [1.5, None, 2.0])
+        columns = decode_columns([[1.5], [2.7], [3.0], [4]], header=False, schema={0: 'int'})
+        self.assertListEqual(columns[0].tolist(), [None, None, 3, 4])
+        columns = decode_columns([['FALSE'], [True], [1], [False]], header=False, schema={0: 'bool'})
+        self.assertListEqual(columns[0].tolist(), [None, True, None, False])
+        columns = decode_columns([[43831], [True]], header=False, schema={0: 'datetime'})
+        self.assertListEqual(columns[0].mask.tolist(), [False, True])
+        columns = decode_columns([[2 ** 63], [1]], header=False)
+        self.assertListEqual(columns[0].tolist(), [None, 1])
+
+    def test_get_columns_by_range(self):
+        formats = {
+            'sheets': [{
+                'data': [{
+                    'rowData': [{
+                        'values': [
+                            {'effectiveFormat': {'numberFormat': {'type': 'NUMBER'}}},
+                            {'effectiveFormat': {'numberFormat': {'type': 'DATE'}}},
+                        ]
+                    }]
+                }]
+            }]
+        }
+        self.sh.mock_response = HttpMockSequence([
+            ({'status': '200'}, json.dumps({'values': [['id', 'day'], [1, 43831], [2]]})),
+            ({'status': '200'}, json.dumps(formats)),
+        ])
+        columns = self.sh.get_columns_by_range("'sheet1'!A1:B3")
+        self.assertEqual(columns['id'].dtype, np.int64)
+        self.assertEqual(columns['day'][0], np.datetime64('2020-01-01'))
+        self.assertTrue(columns['day'].mask[1])
+
+    def test_get_columns_by_sheet_name(self):
+        requested = []
+        fetch_sheet_metadata = self.sh.fetch_sheet_metadata
+        self.sh.fetch_sheet_metadata = lambda params: requested.extend(params['ranges']) or fetch_sheet_metadata(params)
+
+        for _range, row_range in (('Sheet1', "'Sheet1'!2:2"), ('Jan', "'Jan'!2:2"), ("'My Sheet'", "'My Sheet'!2:2"), ('My Sheet', "'My Sheet'!2:2")):
+            self.sh.mock_response = HttpMockSequence([
+                ({'status': '200'}, json.dumps({'values': [['id'], [1]]})),
+                ({'status': '200'}, json.dumps({'sheets': []})),
+            ])
+            self.assertListEqual(self.sh.get_columns_by_range(_range)['id'].tolist(), [1])
+            self.assertEqual(requested.pop(), row_range)
+
+        self.sh.mock_response = HttpMockSequence([])
+        with self.assertRaises(ValueError):
+            self.sh.get_columns_by_range('A1:B2:C3')
+
+class Test_Sync(unittest.TestCase):
+    def setUp(self):
+        self.sh = MockSheet('')
+
+    def test_diff_blocks(self):
+        current = [
+            ['a', 1, 2, 3],
+            ['b', 1, 2, 3],
+            ['c', 1, 2, 3],
+            ['d'],
+        ]
+        target = [
+            ['a', '1', 9, 9],
+            ['b', 1, 9, 9],
+            ['c', 1, 2],
+        ]
+        self.assertListEqual(diff_blocks(current, target), [
+            {'row': 0, 'column': 2, 'values': [[9, 9], [9, 9]]},
+            {'row': 2, 'column': 3, 'values': [['']]},
+            {'row': 3, 'column': 0, 'values': [['']]},
+        ])
+        self.assertListEqual(diff_blocks(current, current), [])
+        self.assertListEqual(diff_blocks([], [['x', None]]), [
+            {'row': 0, 'column': 0, 'values': [['x']]},
+        ])
+
+    def test_sync_values(self):
+        self.sh.mock_response = HttpMockSequence([
+            ({'status': '200'}, json.dumps({'values': [['a', '1'], ['b', '2'], ['c', '3']]})),
+            ({'status': '200'}, json.dumps({'totalUpdatedCells': 4})),
+        ])
+        summary = self.sh.sync_values('sheet1', [['a', 1], ['b', 5], ['c', 3], ['d', 4]], origin='B2')
+        self.assertDictEqual(summary, {
+            'updatedBlocks': 2,
+            'updatedCells': 4,
+            'appendedRows': 1,
+            'removedRows': 0,
+        })
+
+    def test_sync_values_formatted_cells(self):
+        requested = []
+        get_values_by_range = self.sh.get_values_by_range
+        self.sh.get_values_by_range = lambda _range, **kwargs: requested.append(kwargs) or get_values_by_range(_range, **kwargs)
+
+        # Shown as "1,000", "50%" and "2020-01-01" in the sheet
+        self.sh.mock_response = HttpMockSequence([
+            ({'status': '200'}, json.dumps({'values': [['a', 1000], ['b', 0.5], ['c', '2020-01-01']]})),
+        ])
+        summary = self.sh.sync_values('sheet1', [['a', 1000], ['b', 0.5], ['c', '2020-01-01']])
+        self.assertEqual(summary['updatedBlocks'], 0)
+        self.assertEqual(requested[0]['valueRenderOption'], 'UNFORMATTED_VALUE')
+
+    def test_sync_values_unchanged(self):
+        self.sh.mock_response = HttpMockSequence([])
+        summary = self.sh.sync_values('sheet1', [['a']], current=[['a'], []])
+        self.assertEqual(summary['updatedBlocks'], 0)
+
+class Test_ValuesCache(unittest.TestCase):
+    def test_revision(self):
+        cache = ValuesCache()
+        key = cache.make_key('id', 'A1:B2')
+        cache.put(key, [[1]], revision='3')
+        self.assertListEqual(cache.get(key, revision='3'), [[1]])
+        self.assertIsNone(cache.get(key, revision='4'))
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl(self):
+        cache = ValuesCache(ttl=60)
+        cache.put('key', [[1]])
+        self.assertListEqual(cache.get('key', revision='1'), [[1]])
+        cache.ttl = 0
+        self.assertIsNone(cache.get('key'))
+
+    def test_lru(self):
+        cache = ValuesCache(maxsize=2)
+        for key in ('a', 'b'):
+            cache.put(key, [[key]])
+        cache.get('a')
+        cache.put('c', [['c']])
+        self.assertIsNone(cache.get('b'))
+        self.assertListEqual(cache.get('a'), [['a']])
+
+    def test_invalidate(self):
+        cache = ValuesCache()
+        cache.put(cache.make_key('x', 'A1'), [[1]])
+        cache.put(cache.make_key('y', 'A1'), [[1]])
+        cache.invalidate('x')
+        self.assertIsNone(cache.get(cache.make_key('x', 'A1')))
+        self.assertIsNotNone(cache.get(cache.make_key('y', 'A1')))
+
+    def test_copies(self):
+        cache = ValuesCache()
+        values = [['a', 1]]
+        cache.put('key', values)
+        values[0].append('x')
+        cached = cache.get('key')
+        cached[0].append('y')
+        cached.append(['z'])
+        self.assertListEqual(cache.get('key'), [['a', 1]])
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'values')
+            cache = ValuesCache(path=path)
+            cache.put('key', [[1]], revision='1')
+            cache.close()
+
+            cache = ValuesCache(path=path)
+            self.assertListEqual(cache.get('key', revision='1'), [[1]])
+            cache.close()
+
+    def test_sheet_read_through(self):
+        sh = MockSheet('', cache=ValuesCache())
+        sh.mock_response = HttpMockSequence([
+            ({'status': '200'}, json.dumps({'version': '7'})),
+            ({'status': '200'}, json.dumps({'values': [[1]]})),
+            ({'status': '200'}, json.dumps({'version': '7'})),
+            ({'status': '200'}, json.dumps({'version': '7'})),
+            ({'status': '200'}, json.dumps({'updatedCells': 1})),
+            ({'status': '403'}, '{}'),
+            ({'status': '200'}, json.dumps({'values': [[2]]})),
+        ])
+        self.assertListEqual(sh.get_values_by_range('A1'), [[1]])
+        values = sh.get_values_by_range('A1')
+        values[0].append('')
+        self.assertListEqual(sh.get_values_by_range('A1'), [[1]])
+        sh.update_values_by_range('A1', [[2]])
+        self.assertListEqual(sh.get_values_by_range('A1'), [[2]])
+
+    def test_invalidate_after_write(self):
+        class RacingSheet(MockSheet):
+            def _exec_request(self, request, http=None):
+                results = super()._exec_request(request, http=http)
+                # A concurrent read caching values from before the write
+                self.cache.put(self.cache.make_key('', 'A1'), [[1]])
+                return results
+
+        sh = RacingSheet('', cache=ValuesCache(ttl=60))
+        sh.mock_response = HttpMockSequence([({'status': '200'}, json.dumps({'updatedCells': 1}))])
+        sh.update_values_by_range('A1', [[2]])
+        self.assertEqual(len(sh.cache), 0)
+
+class MockGridSheet(MockSheet):
+    def _open_grid_stream(self, params):
+        self.grid_params = params
+        return io.BytesIO(json.dumps(self.mock_response).encode())
+
+class Test_Grid(unittest.TestCase):
+    def setUp(self):
+        self.sh = MockGridSheet('')
+
+    def test_iter_grid_data(self):
+        self.sh.mock_response = {
+            'sheets': [
+                {
+                    'properties': {'sheetId': 0, 'title': 'a', 'gridProperties': {'rowCount': 5}},
+                    'data': [
+                        {
+                            'startRow': 2,
+                            'rowData': [
+                                {'values': [{'effectiveValue': {'numberValue': 1.5}}, {}]},
+                                {},
+                                {'values': [{'effectiveValue': {'stringValue': 'x'}}]},
+                            ]
+                        }
+                    ]
+                },
+                {
+                    'properties': {'sheetId': 1, 'title': 'b'},
+                    'data': [{'startColumn': 1, 'rowData': [{'values': [{'formattedValue': 'y'}]}]}]
+                },
+            ]
+        }
+        rows = list(self.sh.iter_grid_data(ranges=['a!A3:B5']))
+        self.assertIn(('ranges', 'a!A3:B5'), self.sh.grid_params)
+        self.assertListEqual([(r.sheet['title'], r.row, r.column) for r in rows], [
+            ('a', 2, 0), ('a', 3, 0), ('a', 4, 0), ('b', 0, 1)
+        ])
+        self.assertListEqual(rows[0].values, [{'effectiveValue': {'numberValue': 1.5}}, {}])
+        self.assertListEqual(rows[1].values, [])
+        self.assertEqual(rows[0].sheet['gridProperties']['rowCount'], 5)
+
+class MockAsyncSheetsClient(AsyncSheetsClient):
+    async def _authorization(self):
+        return 'Bearer test'
+
+class FakeSheetsEndpoint(object):
+    """Local Sheets API endpoint keeping values of one range in memory"""
+    def __init__(self):
+        self.values = [['a', 1]]
+        self.requests = []
+        self.throttle = 0
+        self.errors = 0
+
+    async def handle(self, request):
+        self.requests.append((request.method, request.path, dict(request.query)))
+        if self.throttle:
+            self.throttle -= 1
+            return web.json_response({}, status=429)
+        if self.errors:
+            self.errors -= 1
+            return web.json_response({}, status=503)
+
+        body = await request.json() if request.can_read_body else {}
+        if request.path.endswith(':batchUpdate'):
+            return web.json_response({'replies': [{} for _ in body['requests']]})
+        if request.path.endswith(':append'):
+            self.values.extend(body['values'])
+            return web.json_response({'updates': {'updatedRows': len(body['values'])}})
+        if '/values/' in request.path:
+            if request.method == 'PUT':
+                self.values = body['values']
+                return web.json_response({'updatedCells': sum(len(row) for row in self.values)})
+            return web.json_response({'values': self.values})
+        return web.json_response({'spreadsheetId': request.match_info['tail'].split('/')[-1]})
+
+    async def run(self, coro_func):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        client = MockAsyncSheetsClient(
+            base_url='http://127.0.0.1:{}/v4/'.format(port),
+            scheduler=QuotaScheduler(read_rate=100, write_rate=100, base_delay=0)
+        )
+        try:
+            async with client:
+                return await coro_func(client)
+        finally:
+            await runner.cleanup()
+
+class Test_AsyncSheet(unittest.TestCase):
+    def setUp(self):
+        self.endpoint = FakeSheetsEndpoint()
+
+    def run_with_client(self, coro_func):
+        return asyncio.run(self.endpoint.run(coro_func))
+
+    def test_methods(self):
+        async def scenario(client):
+            sh = client.sheet('sid')
+            metadata = await sh.fetch_sheet_metadata({'includeGridData': False, 'fields': 'sheets'})
+            values = await sh.get_values_by_range(sh.format_range('s 1', 'A1:B2'), valueRenderOption='UNFORMATTED_VALUE')
+            updated = await sh.update_values_by_range('A1', [['x', 2], ['y', 3]])
+            appended = await sh.append_values('A:B', [['z', 4]])
+            replies = await sh._spreadsheet_batchUpdate([{'addSheet': {}}])
+            return metadata, values, updated, appended, replies
+
+        metadata, values, updated, appended, replies = self.run_with_client(scenario)
+        self.assertEqual(metadata['spreadsheetId'], 'sid')
+        self.assertListEqual(values, [['a', 1]])
+        self.assertEqual(updated, 4)
+        self.assertDictEqual(appended, {'updatedRows': 1})
+        self.assertListEqual(replies['replies'], [{}])
+        self.assertListEqual(self.endpoint.values, [['x', 2], ['y', 3], ['z', 4]])
+        self.assertEqual(self.endpoint.requests[1][1], "/v4/spreadsheets/sid/values/'s 1'!A1:B2")
+        self.assertDictEqual(self.endpoint.requests[1][2], {'valueRenderOption': 'UNFORMATTED_VALUE'})
+
+    def test_concurrent_requests(self):
+        async def scenario(client):
+            sheets = [client.sheet(str(i)) for i in range(20)]
+            return await asyncio.gather(*(sh.get_values_by_range('A1') for sh in sheets))
+
+        self.endpoint.throttle = 2
+        results = self.run_with_client(scenario)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(len(self.endpoint.requests), 22)
+
+    def test_error(self):
+        async def scenario(client):
+            return await client.sheet('sid').get_values_by_range('A1')
+
+        self.endpoint.throttle = 10
+        with self.assertRaises(HttpError):
+            self.run_with_client(scenario)
+
+    def test_server_error_retry(self):
+        async def scenario(client):
+            sh = client.sheet('sid')
+            self.endpoint.errors = 1
+            values = await sh.get_values_by_range('A1')
+            self.endpoint.errors = 1
+            with self.assertRaises(HttpError):
+                await sh.append_values('A:B', [['z', 4]])
+            return values
+
+        self.assertListEqual(self.run_with_client(scenario), [['a', 1]])
+        self.assertEqual(len(self.endpoint.requests), 3)
+        self.assertListEqual(self.endpoint.values, [['a', 1]])
+
+    def test_close(self):
+        async def scenario():
+            async with AsyncSheet('sid') as sh:
+                own_session = sh.client._session()
+            client = AsyncSheetsClient()
+            async with client:
+                async with client.sheet('sid') as sh:
+                    shared_session = client._session()
+                shared_closed = shared_session.closed
+            return own_session.closed, shared_closed
+
+        own_closed, shared_closed = asyncio.run(scenario())
+        self.assertTrue(own_closed)
+        self.assertFalse(shared_closed)
+
+class Test_RateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.sh = MockSheet('')
+
+    def test_reserve(self):
+        limiter = RateLimiter(2, burst=1)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertGreater(limiter.reserve(), 0)
+        self.assertEqual(limiter.queue_depth, 1)
+
+    def test_adapt_rate(self):
+        limiter = RateLimiter(8, min_rate=1)
+        limiter.on_throttled()
+        self.assertEqual(limiter.rate, 4)
+        for _ in range(100):
+            limiter.on_throttled()
+        self.assertEqual(limiter.rate, 1)
+        for _ in range(100):
+            limiter.on_success()
+        self.assertEqual(limiter.rate, 8)
+
+    def test_execute_retry(self):
+        scheduler = QuotaScheduler(read_rate=100, base_delay=0)
+        request = self.sh.spreadsheets.values().get(spreadsheetId='', range='A1:C1')
+        http = HttpMockSequence([
+            ({'status': '429'}, '{}'),
+            ({'status': '503'}, '{}'),
+            ({'status': '200'}, json.dumps({'values': [[1, 2, 3]]})),
+        ])
+        self.assertDictEqual(scheduler.execute(request, http=http), {'values': [[1, 2, 3]]})
+        self.assertLess(scheduler.read.rate, 100)
+        self.assertEqual(scheduler.write.rate, scheduler.write.max_rate)
+
+    def test_execute_give_up(self):
+        scheduler = QuotaScheduler(write_rate=100, base_delay=0, max_retries=1)
+        request = self.sh.spreadsheets.values().append(
+            spreadsheetId='', range='A1', valueInputOption='RAW', body={'values': []}
+        )
+        http = HttpMockSequence([
+            ({'status': '429'}, '{}'),
+            ({'status': '429'}, '{}'),
+        ])
+        with self.assertRaises(HttpError):
+            scheduler.execute(request, http=http)
+
+    def test_execute_non_idempotent(self):
+        scheduler = QuotaScheduler(write_rate=100, base_delay=0)
+        request = self.sh.spreadsheets.values().append(
+            spreadsheetId='', range='A1', valueInputOption='RAW', body={'values': [[1]]}
+        )
+        http = HttpMockSequence([
+            ({'status': '429'}, '{}'),
+            ({'status': '503'}, '{}'),
+            ({'status': '200'}, json.dumps({'updates': {}})),
+        ])
+        with self.assertRaises(HttpError) as cm:
+            scheduler.execute(request, http=http)
+        self.assertEqual(cm.exception.resp.status, 503)
+
+        http = HttpMockSequence([
+            ({'status': '503'}, '{}'),
+            ({'status': '200'}, json.dumps({'updates': {}})),
+        ])
+        self.assertDictEqual(scheduler.execute(request, http=http, idempotent=True), {'updates': {}})
+
+    def test_shared_scheduler(self):
+        self.assertIs(QuotaScheduler.shared('project'), QuotaScheduler.shared('project'))
+        self.assertIsNot(QuotaScheduler.shared('project', 'a@x'), QuotaScheduler.shared('project', 'b@x'))
+        self.assertEqual(QuotaScheduler().read.max_rate, 1.0)
+        self.assertIs(self.sh.scheduler, MockSheet('').scheduler)
+
+class Test_RequestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = RequestMetrics()
+        self.sh = Sheet('sid', scheduler=QuotaScheduler(read_rate=100, write_rate=100, base_delay=0), metrics=self.metrics)
+
+    def test_histogram(self):
+        histogram = Histogram(buckets=(1, 2))
+        for value in (0.5, 1.5, 3):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertDictEqual(snapshot['buckets'], {'1': 1, '2': 2, '+Inf': 3})
+        self.assertEqual(snapshot['count'], 3)
+        self.assertEqual(snapshot['max'], 3)
+
+    def test_exec_request(self):
+        events = []
+        self.metrics.add_hook(events.append)
+        request = self.sh.spreadsheets.values().update(
+            spreadsheetId='sid', range='A1', valueInputOption='RAW', body={'values': [[1]]}
+        )
+        http = HttpMockSequence([
+            ({'status': '429'}, '{}'),
+            ({'status': '200'}, json.dumps({'updatedCells': 1})),
+        ])
+        self.sh._exec_request(request, http=http)
+
+        request = self.sh.spreadsheets.values().get(spreadsheetId='sid', range='A1')
+        with self.assertRaises(HttpError):
+            self.sh._exec_request(request, http=HttpMockSequence([({'status': '404'}, '{}')]))
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]['method'], 'sheets.spreadsheets.values.update')
+        self.assertEqual(events[0]['retries'], 1)
+        self.assertEqual(events[0]['throttled'], 1)
+        self.assertEqual(events[0]['quota_units'], 2)
+        self.assertEqual(events[0]['status'], 200)
+        self.assertGreater(events[0]['request_bytes'], 0)
+        request = HttpRequest(HttpMock(), None, 'http://localhost/', method='POST', body='{"values": [["\u00e9"]]}')
+        self.assertEqual(self.metrics.track('sid', request).event['request_bytes'], len('{"values": [["\u00e9"]]}') + 1)
+        self.assertEqual(events[0]['response_bytes'], len('{}') + len(json.dumps({'updatedCells': 1})))
+        self.assertEqual(events[1]['error'], 'HttpError')
+        self.assertEqual(events[1]['status'], 404)
+
+        snapshot = self.metrics.snapshot()
+        json.dumps(snapshot)
+        self.assertEqual(snapshot['total']['count'], 2)
+        self.assertEqual(snapshot['total']['errors'], 1)
+        self.assertEqual(snapshot['spreadsheets']['sid']['sheets.spreadsheets.values.get']['latency']['count'], 1)
+
+        def broken_hook(event):
+            raise RuntimeError('hook failed')
+        self.metrics.add_hook(broken_hook)
+        request = self.sh.spreadsheets.values().get(spreadsheetId='sid', range='A1')
+        with self.assertLogs(level='ERROR'):
+            result = self.sh._exec_request(request, http=HttpMockSequence([({'status': '200'}, json.dumps({'values': [[1]]}))]))
+        self.assertDictEqual(result, {'values': [[1]]})
+        self.assertEqual(len(events), 3)
+        self.metrics.remove_hook(broken_hook)
+
+        self.metrics.remove_hook(events.append)
+        self.metrics.reset()
+        self.assertDictEqual(self.metrics.snapshot()['spreadsheets'], {})
+
+class Test_FakeSheetsServer(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSheetsServer().start()
+        self.server.add_spreadsheet('sid', {'data': [['a', 1], ['b', 2]]})
+        self.tmpdir = tempfile.TemporaryDirectory()
+        credential_path = os.path.join(self.tmpdir.name, 'credentials.json')
+        write_credentials(credential_path, self.server.url + 'token')
+        self.sh = Sheet(
+            'sid',
+            credential_path=credential_path,
+            scheduler=QuotaScheduler(read_rate=100, write_rate=100, base_delay=0),
+            cache=ValuesCache(),
+            metrics=RequestMetrics(),
+            client_options={'api_endpoint': self.server.url}
+        )
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        self.assertEqual(self.sh.get_sheet_id('data'), 0)
+        self.assertListEqual(self.sh.get_values_by_range("'data'!A1:B2"), [['a', 1], ['b', 2]])
+        self.assertListEqual(self.sh.get_values_by_range("'data'!A1:B2"), [['a', 1], ['b', 2]])
+        self.sh.append_values("'data'!A1", [['c', 3]])
+        self.assertListEqual(list(self.sh.iter_rows('data')), [['a', 1], ['b', 2], ['c', 3]])
+        self.sh.sync_values('data', [['a', 1], ['x', 2]])
+        self.assertListEqual(self.sh.get_values_by_range("'data'!A1:B3"), [['a', 1], ['x', 2]])
+        self.assertListEqual([row.row for row in self.sh.iter_grid_data()], [0, 1, 2])
+
+    def test_cache_hit_skips_sheets_quota(self):
+        reads = []
+        execute = self.sh.scheduler.read.execute
+        self.sh.scheduler.read.execute = lambda request, **kwargs: reads.append(request) or execute(request, **kwargs)
+
+        for _ in range(3):
+            self.assertListEqual(self.sh.get_values_by_range("'data'!A1:B2"), [['a', 1], ['b', 2]])
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(self.sh.metrics.snapshot()['total']['quota_units'], 1)
+        self.assertEqual(self.server.stats['requests'], 4)
+
+    def test_stream_metrics(self):
+        self.sh.get_sheet_id('data')
+        self.server.reset_stats()
+        events = []
+        self.sh.metrics.add_hook(events.append)
+        self.assertEqual(len(list(self.sh.iter_grid_data())), 2)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['method'], 'sheets.spreadsheets.get.stream')
+        self.assertEqual(events[0]['status'], 200)
+        self.assertEqual(events[0]['response_bytes'], self.server.stats['bytes_sent'])
+
+        stream = self.sh._open_grid_stream([('includeGridData', 'true')])
+        time.sleep(0.1)
+        stream.read()
+        stream.close()
+        self.assertGreaterEqual(events[1]['latency'], 0.1)
+
+    def test_fault_injection(self):
+        self.server.throttle_rate = 1.0
+        self.sh.scheduler.read.max_retries = 1
+        with self.assertRaises(HttpError):
+            self.sh.fetch_sheet_metadata()
+        self.assertEqual(self.server.stats['throttled'], 2)
+        self.assertGreater(self.server.stats['bytes_sent'], 0)
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file
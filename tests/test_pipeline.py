@@ -0,0 +1,219 @@
+import os
+import time
+import datetime
+import decimal
+import tempfile
+import unittest
+
+import numpy as np
+
+from ..datacommon.google_app import Sheet
+from ..datacommon.google_app import decode_columns
+from ..datacommon.pipeline import *
+from ..datacommon.pipeline import parallel
+
+class FakeQuery(object):
+    def __init__(self, rows):
+        self.rows = rows
+        self.description = None
+
+    def iter_query(self, sql, args=None, chunk_size=1000):
+        self.description = (('id',), ('amount',))
+        for i in range(0, len(self.rows), chunk_size):
+            yield self.rows[i:i + chunk_size]
+
+class EndlessQuery(FakeQuery):
+    def __init__(self):
+        super().__init__([])
+        self.fetched = 0
+        self.closed = False
+
+    def iter_query(self, sql, args=None, chunk_size=1000):
+        self.description = (('id',),)
+        try:
+            while True:
+                self.fetched += 1
+                yield [(i,) for i in range(chunk_size)]
+        finally:
+            self.closed = True
+
+class FakeSheet(object):
+    format_range = staticmethod(Sheet.format_range)
+
+    def __init__(self, row_count=1000, fail_at=None):
+        self.row_count = row_count
+        self.fail_at = fail_at
+        self.updates = []
+        self.batch_updates = []
+
+    def get_sheet_properties(self, sheet_name):
+        return {'sheetId': 7, 'title': sheet_name, 'gridProperties': {'rowCount': self.row_count, 'columnCount': 26}}
+
+    def _spreadsheet_batchUpdate(self, requests):
+        self.batch_updates.extend(requests)
+        return {}
+
+    def update_values_by_range(self, _range, values, valueInputOption='USER_ENTERED'):
+        if self.fail_at is not None and len(self.updates) == self.fail_at:
+            raise RuntimeError('upload failed')
+        self.updates.append((_range, values))
+        return sum(len(row) for row in values)
+
+class Test_Transfer(unittest.TestCase):
+    def test_to_sheet_value(self):
+        self.assertEqual(to_sheet_value(None), '')
+        self.assertEqual(to_sheet_value(decimal.Decimal('1.10')), '1.10')
+        self.assertEqual(to_sheet_value(datetime.datetime(2020, 1, 2, 3, 4, 5)), '2020-01-02 03:04:05')
+        self.assertEqual(to_sheet_value(datetime.date(2020, 1, 2)), '2020-01-02')
+        self.assertEqual(to_sheet_value(b'abc'), "'abc")
+        self.assertEqual(to_sheet_value('00123'), "'00123")
+        self.assertEqual(to_sheet_value('=1+1'), "'=1+1")
+        self.assertEqual(to_sheet_value('=1+1', escape_text=False), '=1+1')
+        self.assertEqual(to_sheet_value(''), '')
+        self.assertEqual(to_sheet_value(datetime.timedelta(days=1, hours=1)), '25:00:00')
+        self.assertEqual(to_sheet_value(datetime.timedelta(hours=-1)), '-1:00:00')
+        self.assertEqual(to_sheet_value(datetime.timedelta(seconds=5, microseconds=250000)), '0:00:05.250000')
+        self.assertEqual(to_sheet_value(float('nan')), '')
+        self.assertIs(to_sheet_value(True), True)
+        self.assertListEqual(to_sheet_rows([{'a': 1, 'b': None}]), [[1, '']])
+
+    def test_run(self):
+        rows = [(i, decimal.Decimal(i)) for i in range(25)]
+        sheet = FakeSheet(row_count=10)
+        report = QueryToSheetTransfer(FakeQuery(rows), sheet, 'sheet1', chunk_size=10, queue_size=1).run('SELECT 1')
+        self.assertEqual(report['rows'], 25)
+        self.assertEqual(report['chunks'], 3)
+        self.assertListEqual([r for r, _ in sheet.updates], ["'sheet1'!A1", "'sheet1'!A12", "'sheet1'!A22"])
+        self.assertListEqual(sheet.updates[0][1][:2], [['id', 'amount'], [0, '0']])
+        self.assertEqual(sheet.batch_updates[0]['appendDimension']['dimension'], 'ROWS')
+        self.assertGreaterEqual(10 + sum(r['appendDimension']['length'] for r in sheet.batch_updates), 26)
+
+    def test_resume(self):
+        rows = [(i, i) for i in range(25)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            checkpoint = os.path.join(tmpdir, 'checkpoint.json')
+            sheet = FakeSheet(fail_at=1)
+            transfer = QueryToSheetTransfer(FakeQuery(rows), sheet, 'sheet1', chunk_size=10, checkpoint_path=checkpoint)
+            with self.assertRaises(RuntimeError):
+                transfer.run('SELECT 1')
+            self.assertEqual(transfer.load_checkpoint(), 10)
+
+            sheet.fail_at = None
+            report = transfer.run('SELECT 1')
+            self.assertEqual(report['resumed_from'], 10)
+            self.assertEqual(report['rows'], 15)
+            self.assertEqual(sheet.updates[1], ("'sheet1'!A12", [[i, i] for i in range(10, 20)]))
+            self.assertFalse(os.path.exists(checkpoint))
+
+    def test_upload_failure_aborts_source(self):
+        query = EndlessQuery()
+        sheet = FakeSheet(fail_at=1)
+        with self.assertRaises(RuntimeError):
+            QueryToSheetTransfer(query, sheet, 'sheet1', chunk_size=10, queue_size=2).run('SELECT 1')
+        self.assertTrue(query.closed)
+        self.assertLess(query.fetched, 10)
+
+    def test_text_escaping(self):
+        for option, expected in (('USER_ENTERED', "'007"), ('RAW', '007')):
+            sheet = FakeSheet()
+            QueryToSheetTransfer(FakeQuery([(1, '007')]), sheet, 'sheet1', valueInputOption=option).run('SELECT 1')
+            self.assertListEqual(sheet.updates[0][1][1], [1, expected])
+
+    def test_empty_result(self):
+        sheet = FakeSheet()
+        report = QueryToSheetTransfer(FakeQuery([]), sheet, 'sheet1').run('SELECT 1')
+        self.assertEqual(report['rows'], 0)
+        self.assertListEqual(sheet.updates, [("'sheet1'!A1", [['id', 'amount']])])
+
+def column_sums(columns):
+    return {key: float(np.ma.sum(column)) for key, column in columns.items()}
+
+def first_column(columns):
+    return next(iter(columns.values()))
+
+def slow_column_sums(columns):
+    time.sleep(0.2)
+    return column_sums(columns)
+
+class RecordingTransform(ParallelTransform):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shared_names = []
+
+    def _submit(self, chunk):
+        future, shm = super()._submit(chunk)
+        self.shared_names.append(shm.name)
+        return future, shm
+
+class Test_ParallelTransform(unittest.TestCase):
+    def setUp(self):
+        self.transform = ParallelTransform(workers=2, max_pending=2, shared_memory_min_bytes=1)
+
+    def tearDown(self):
+        self.transform.close()
+
+    def test_rows_in_order(self):
+        chunks = chunked(((i, decimal.Decimal(i), None) for i in range(100)), 7)
+        results = self.transform.map(chunks)
+        self.assertEqual(len(results), 15)
+        self.assertListEqual([row for chunk in results for row in chunk], [[i, str(i), ''] for i in range(100)])
+
+    def test_shared_columns(self):
+        transform = ParallelTransform(func=column_sums, workers=2, shared_memory_min_bytes=1)
+        chunks = [
+            {'a': np.arange(1000, dtype=np.int64) + i, 'b': np.ma.MaskedArray([1.5, 2.5], mask=[False, True])}
+            for i in range(4)
+        ]
+        with transform:
+            results = transform.map(chunks)
+        self.assertListEqual([r['a'] for r in results], [float(np.arange(1000).sum() + 1000 * i) for i in range(4)])
+        self.assertListEqual([r['b'] for r in results], [1.5] * 4)
+
+    def test_result_referencing_shared_buffer(self):
+        transform = ParallelTransform(func=first_column, workers=1, shared_memory_min_bytes=1)
+        with transform:
+            result = transform.map([{'a': np.arange(10)}])[0]
+        self.assertListEqual(result.tolist(), list(range(10)))
+
+    @unittest.skipIf(parallel.shared_memory is None, 'requires multiprocessing.shared_memory')
+    def test_release_on_early_exit(self):
+        transform = RecordingTransform(func=slow_column_sums, workers=1, max_pending=8, shared_memory_min_bytes=1)
+        chunks = [{'a': np.arange(100) + i} for i in range(10)]
+        with transform:
+            results = transform.imap(chunks)
+            next(results)
+            closing = time.monotonic()
+            results.close()
+            # Queued chunks are cancelled instead of waited for
+            self.assertLess(time.monotonic() - closing, 1.0)
+
+        self.assertEqual(len(transform.shared_names), 8)
+        for name in transform.shared_names:
+            with self.assertRaises(FileNotFoundError):
+                parallel.shared_memory.SharedMemory(name=name)
+
+    def test_columns_to_sheet_rows(self):
+        columns = decode_columns(
+            [['id', 'price', 'day', 'name'], [1, 1.5, 43831, 'a'], [2, '', 43831.5]],
+            schema={'day': 'datetime'}
+        )
+        expected = [
+            [1, 1.5, '2020-01-01 00:00:00', 'a'],
+            [2, '', '2020-01-01 12:00:00', ''],
+        ]
+        self.assertListEqual(columns_to_sheet_rows(columns), expected)
+
+        numeric = {key: columns[key] for key in ('id', 'price', 'day')}
+        with ParallelTransform(func=columns_to_sheet_rows, workers=1, shared_memory_min_bytes=1) as transform:
+            self.assertListEqual(transform.map([numeric])[0], [row[:3] for row in expected])
+
+    def test_transfer_with_transform(self):
+        rows = [(i, datetime.date(2020, 1, 1)) for i in range(30)]
+        sheet = FakeSheet()
+        report = QueryToSheetTransfer(FakeQuery(rows), sheet, 'sheet1', chunk_size=8, transform=self.transform).run('SELECT 1')
+        self.assertEqual(report['rows'], 30)
+        uploaded = [row for _, values in sheet.updates for row in values][1:]
+        self.assertListEqual(uploaded, [[i, '2020-01-01'] for i in range(30)])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)